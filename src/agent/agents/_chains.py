@@ -0,0 +1,28 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Tuple
+
+from langchain_core.output_parsers import StrOutputParser
+
+_MAX_ENTRIES = 64  # 7 prompt kinds x the models in use, with room to spare
+
+# Prompts are module constants and StrOutputParser is stateless, so a chain only
+# depends on (prompt, llm). LLM clients aren't hashable, so key on identity and
+# keep the objects in the entry to pin their ids.
+_chains: "OrderedDict[Tuple[int, int], Tuple[Any, Any, Any]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def chain_for(prompt, llm):
+    """Return the cached `prompt | llm | StrOutputParser()` chain, composing it on first use."""
+    key = (id(prompt), id(llm))
+    with _lock:
+        entry = _chains.get(key)
+        if entry is not None and entry[0] is prompt and entry[1] is llm:
+            _chains.move_to_end(key)
+            return entry[2]
+        chain = prompt | llm | StrOutputParser()
+        _chains[key] = (prompt, llm, chain)
+        if len(_chains) > _MAX_ENTRIES:
+            _chains.popitem(last=False)
+        return chain
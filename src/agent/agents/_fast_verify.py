@@ -0,0 +1,56 @@
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+# Opt-in (AGENT_FAST_VERIFY=1): the shortcut only checks that names are mentioned,
+# not that conditions, operators or literals are described correctly.
+ENABLED = os.environ.get("AGENT_FAST_VERIFY", "0") == "1"
+
+# Names shorter than this (a, x, id, ok) say too little to count as "mentioned"
+MIN_TERM_LEN = 3
+
+_CAMEL_RE = re.compile(r"([a-z0-9])([A-Z])")
+_PART_RE = re.compile(r"[a-z0-9]+")
+
+
+def _split_camel(text: str) -> str:
+    # "creditScore" -> "credit Score", so its parts sit on word boundaries
+    return _CAMEL_RE.sub(r"\1 \2", text)
+
+
+@lru_cache(maxsize=1024)
+def _term_pattern(name: str) -> Optional["re.Pattern[str]"]:
+    """
+    Word-boundary pattern for the last segment of a field name, or None if it is
+    too short to check. "applicant.creditScore" matches "credit score",
+    "credit_score", "credit-score" and "creditScore", but not "discredit scores".
+    """
+    term = name.rsplit(".", 1)[-1]
+    parts = _PART_RE.findall(_split_camel(term).casefold())
+    if not parts or sum(map(len, parts)) < MIN_TERM_LEN:
+        return None
+    return re.compile(r"\b" + r"[\s_-]*".join(parts) + r"\b")
+
+
+def trivial_check(extraction: Dict[str, Any], english: str) -> Optional[Dict[str, Any]]:
+    """
+    Deterministic verdict for rules too small to need the LLM verifier, else None.
+
+    Only fires for a single-branch rule with outputs, where every output and every
+    referenced variable is named (as a whole word) in the explanation. Anything
+    else, including rules with very short names, goes to the LLM.
+    """
+    if not ENABLED or not english:
+        return None
+    branches = extraction.get("branches", [])
+    outputs = extraction.get("outputs", [])
+    if len(branches) > 1 or not outputs:
+        return None
+
+    text = _split_camel(english).casefold()
+    for name in list(outputs) + list(extraction.get("variables", [])):
+        pattern = _term_pattern(name)
+        if pattern is None or not pattern.search(text):
+            return None
+    return {"ok": True, "missing": [], "rewrite_needed": False}
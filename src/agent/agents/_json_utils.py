@@ -0,0 +1,115 @@
+import json
+from typing import Any, Iterable, List, Optional, Union
+
+# orjson is a C extension and much faster than stdlib json for both directions;
+# keep stdlib as a fallback so the agents still run where it isn't installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumpb(obj: Any, *, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes (non-ASCII kept as-is, like ensure_ascii=False)."""
+    if orjson is not None:
+        option = 0
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    if indent:
+        text = json.dumps(obj, ensure_ascii=False, indent=2, sort_keys=sort_keys)
+    else:
+        text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys)
+    return text.encode("utf-8")
+
+
+def dumps(obj: Any, *, indent: bool = False, sort_keys: bool = False) -> str:
+    return dumpb(obj, indent=indent, sort_keys=sort_keys).decode("utf-8")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def as_str_list(items: Optional[Iterable[Any]]) -> List[str]:
+    """Coerce LLM-returned list items (sometimes objects instead of strings) to strings."""
+    return [
+        m if isinstance(m, str) else dumps(m) if isinstance(m, (dict, list)) else str(m)
+        for m in (items or [])
+    ]
+
+
+class JsonSpanScanner:
+    """
+    Incremental bracket matcher for streamed LLM output: feed() text chunks as
+    they arrive and get the first balanced open_ch...close_ch span back as soon
+    as it closes. Brackets inside JSON strings are ignored.
+    """
+
+    def __init__(self, open_ch: str = "{", close_ch: str = "}"):
+        self.open_ch = open_ch
+        self.close_ch = close_ch
+        self._text = ""
+        self._pos = 0
+        self._start = -1
+        self._depth = 0
+        self._in_str = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        self._text += chunk
+        text = self._text
+        if self._start == -1:
+            self._start = text.find(self.open_ch, self._pos)
+            if self._start == -1:
+                self._pos = len(text)
+                return None
+            self._pos = self._start
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_str:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch == self.open_ch:
+                self._depth += 1
+            elif ch == self.close_ch:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._pos = i + 1
+                    return text[self._start:i + 1]
+        self._pos = len(text)
+        return None
+
+    def skip(self) -> None:
+        """Drop the span just returned; the next feed() looks for the one after it."""
+        self._start = -1
+        self._depth = 0
+        self._in_str = False
+        self._escaped = False
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return self._text
+
+
+def extract_json(text: str, open_ch: str = "{", close_ch: str = "}") -> Optional[str]:
+    """
+    Return the first balanced open_ch...close_ch span in an LLM reply, or None.
+    Single forward scan that ignores brackets inside JSON strings, so prose
+    around the JSON (or after it) doesn't need a second find/rfind pass.
+    """
+    text = text.strip()
+    if text[:1] == open_ch and text[-1:] == close_ch:
+        return text
+    return JsonSpanScanner(open_ch, close_ch).feed(text)
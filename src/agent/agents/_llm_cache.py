@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import threading
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from agent.agents._json_utils import JsonSpanScanner, dumpb, loads
+from agent.agents.redis_mini import MiniRedis
+
+# Shared response cache for agent chains (exact match on prompt inputs).
+_redis = MiniRedis(host="127.0.0.1", port=6379)
+
+DEFAULT_TTL = 24 * 3600
+
+# id(prompt) -> (prompt, fingerprint). Prompts are module constants, so this
+# stays tiny; the object is kept in the entry to pin its id.
+_prompt_fps: Dict[int, Tuple[Any, str]] = {}
+_fp_lock = threading.Lock()
+
+# key -> cached reply (or None) fetched by prefetched(); async lookups consume
+# entries from here instead of making their own round trip. Context-local, so
+# only the tasks started inside the `async with` block see it.
+_prefetched: ContextVar[Optional[Dict[str, Optional[str]]]] = ContextVar("llmc_prefetched", default=None)
+
+
+def _model_tag(chain) -> Tuple[Optional[str], Optional[float]]:
+    """Find the (model, temperature) of the LLM step inside a prompt | llm | parser chain."""
+    for step in getattr(chain, "steps", ()):
+        model = getattr(step, "model", None)
+        if model is not None:
+            return model, getattr(step, "temperature", None)
+    return None, None
+
+
+def _prompt_fingerprint(chain) -> Optional[str]:
+    """
+    Hash of the prompt template at the head of the chain (computed once per
+    prompt object), so editing a prompt in prompts.py stops serving replies
+    generated from the old wording.
+    """
+    prompt = getattr(chain, "first", None)
+    if prompt is None:
+        return None
+    entry = _prompt_fps.get(id(prompt))
+    if entry is not None and entry[0] is prompt:
+        return entry[1]
+    parts = []
+    for msg in getattr(prompt, "messages", None) or [prompt]:
+        template = getattr(getattr(msg, "prompt", None), "template", None)
+        parts.append([type(msg).__name__, template if template is not None else repr(msg)])
+    fp = hashlib.sha256(dumpb(parts)).hexdigest()
+    with _fp_lock:
+        _prompt_fps[id(prompt)] = (prompt, fp)
+    return fp
+
+
+def cache_key(chain, inputs: Dict[str, Any], ns: str) -> str:
+    model, temperature = _model_tag(chain)
+    blob = dumpb({
+        "prompt": _prompt_fingerprint(chain),
+        "model": model,
+        "temperature": temperature,
+        "inputs": inputs,
+    }, sort_keys=True)
+    return "llmc:" + ns + ":" + hashlib.sha256(blob).hexdigest()
+
+
+def _lookup(key: str) -> Optional[str]:
+    try:
+        hit = _redis.get(key)
+    except (OSError, RuntimeError):
+        return None
+    return None if hit is None else hit.decode("utf-8")
+
+
+def _lookup_many(keys: List[str]) -> List[Optional[str]]:
+    """GET several keys in one pipelined round trip."""
+    pipe = _redis.pipeline()
+    for key in keys:
+        pipe.get(key)
+    try:
+        hits = pipe.execute()
+    except (OSError, RuntimeError):
+        return [None] * len(keys)
+    return [None if hit is None else hit.decode("utf-8") for hit in hits]
+
+
+async def _alookup(key: str) -> Optional[str]:
+    pre = _prefetched.get()
+    if pre is not None and key in pre:
+        return pre.pop(key)
+    return await asyncio.to_thread(_lookup, key)
+
+
+@asynccontextmanager
+async def prefetched(calls: List[Tuple[Any, Dict[str, Any], str]]) -> AsyncIterator[None]:
+    """
+    Look up the cached replies for several (chain, inputs, ns) calls that are
+    about to run concurrently in one pipelined round trip. acached_invoke /
+    acached_invoke_json calls for those keys made inside the block (including in
+    tasks it starts) use the prefetched result instead of a GET of their own.
+    """
+    keys = [cache_key(chain, inputs, ns) for chain, inputs, ns in calls]
+    hits = await asyncio.to_thread(_lookup_many, keys)
+    token = _prefetched.set(dict(zip(keys, hits)))
+    try:
+        yield
+    finally:
+        _prefetched.reset(token)
+
+
+def _store(key: str, value: str, ttl: int) -> None:
+    try:
+        _redis.setex(key, ttl, value)
+    except (OSError, RuntimeError):
+        pass
+
+
+def _accepted(value: str, accept: Optional[Callable[[Any], bool]]) -> bool:
+    try:
+        obj = loads(value)
+    except ValueError:
+        return False
+    return accept is None or accept(obj)
+
+
+def _next_accepted(scanner: JsonSpanScanner, chunk: str,
+                   accept: Optional[Callable[[Any], bool]]) -> Optional[str]:
+    # a bracketed aside in leading prose ("see [3] below") closes first: skip
+    # spans that don't parse to the expected shape and keep scanning
+    value = scanner.feed(chunk)
+    while value is not None and not _accepted(value, accept):
+        scanner.skip()
+        value = scanner.feed("")
+    return value
+
+
+def cached_invoke(chain, inputs: Dict[str, Any], *, ns: str, ttl: int = DEFAULT_TTL) -> str:
+    """
+    chain.invoke(inputs) with the string response cached in Redis under a key
+    derived from the namespace, model, temperature and inputs.
+    Cache errors are never fatal: on any Redis failure we just call the LLM.
+    """
+    key = cache_key(chain, inputs, ns)
+    hit = _lookup(key)
+    if hit is not None:
+        return hit
+
+    value = chain.invoke(inputs)
+    _store(key, value, ttl)
+    return value
+
+
+async def acached_invoke(chain, inputs: Dict[str, Any], *, ns: str, ttl: int = DEFAULT_TTL) -> str:
+    """Async cached_invoke: a cache hit returns without touching the LLM, a miss awaits chain.ainvoke."""
+    key = cache_key(chain, inputs, ns)
+    hit = await _alookup(key)
+    if hit is not None:
+        return hit
+
+    value = await chain.ainvoke(inputs)
+    await asyncio.to_thread(_store, key, value, ttl)
+    return value
+
+
+def cached_invoke_json(chain, inputs: Dict[str, Any], *, ns: str,
+                       open_ch: str = "{", close_ch: str = "}",
+                       accept: Optional[Callable[[Any], bool]] = None, ttl: int = DEFAULT_TTL) -> str:
+    """
+    cached_invoke for agents that answer with a JSON object/array. On a miss the
+    reply is streamed and generation is cut off as soon as a JSON value closes
+    that parses and passes `accept` (the expected shape). That span is returned
+    and cached; if none is found the whole reply is returned, uncached, for the
+    caller to recover from.
+    """
+    key = cache_key(chain, inputs, ns)
+    hit = _lookup(key)
+    if hit is not None:
+        return hit
+
+    scanner = JsonSpanScanner(open_ch, close_ch)
+    value = None
+    stream = chain.stream(inputs)
+    try:
+        for chunk in stream:
+            value = _next_accepted(scanner, chunk, accept)
+            if value is not None:
+                break
+    finally:
+        stream.close()
+    if value is None:
+        return scanner.text
+    _store(key, value, ttl)
+    return value
+
+
+async def acached_invoke_json(chain, inputs: Dict[str, Any], *, ns: str,
+                              open_ch: str = "{", close_ch: str = "}",
+                              accept: Optional[Callable[[Any], bool]] = None, ttl: int = DEFAULT_TTL) -> str:
+    """Async cached_invoke_json over chain.astream."""
+    key = cache_key(chain, inputs, ns)
+    hit = await _alookup(key)
+    if hit is not None:
+        return hit
+
+    scanner = JsonSpanScanner(open_ch, close_ch)
+    value = None
+    stream = chain.astream(inputs)
+    try:
+        async for chunk in stream:
+            value = _next_accepted(scanner, chunk, accept)
+            if value is not None:
+                break
+    finally:
+        await stream.aclose()
+    if value is None:
+        return scanner.text
+    await asyncio.to_thread(_store, key, value, ttl)
+    return value
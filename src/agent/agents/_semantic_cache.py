@@ -0,0 +1,98 @@
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+from agent.agents.redis_mini import MiniRedis
+
+_log = logging.getLogger(__name__)
+
+# Near-duplicate lookup in front of the exact-hash explain cache. Off by default:
+# two rules can embed almost identically yet differ in a threshold or operator,
+# and reusing the other rule's explanation would then be wrong.
+ENABLED = os.environ.get("AGENT_SEMANTIC_CACHE", "0") == "1"
+THRESHOLD = float(os.environ.get("AGENT_SEMANTIC_THRESHOLD", "0.9"))
+MODEL_NAME = os.environ.get("AGENT_SEMANTIC_MODEL", "all-MiniLM-L6-v2")
+
+# rule_hash -> float32 embedding bytes, shared between processes
+_REDIS_KEY = "mvel:semantic:emb"
+_redis = MiniRedis(host="127.0.0.1", port=6379)
+
+_lock = threading.Lock()
+_model = None
+_np = None
+_vectors = None            # (n, dim) float32, rows L2-normalized
+_hashes: List[str] = []    # rule_hash for each row of _vectors
+_loaded = False
+
+
+def _load() -> bool:
+    """Load the embedding model and the shared embeddings once; False if unavailable."""
+    global _model, _np, _vectors, _loaded
+    if _loaded:
+        return _model is not None
+    with _lock:
+        if _loaded:
+            return _model is not None
+        try:
+            import numpy as np
+            from sentence_transformers import SentenceTransformer
+            _np = np
+            _model = SentenceTransformer(MODEL_NAME)
+        except Exception:
+            _log.warning("semantic cache disabled: could not load %s", MODEL_NAME, exc_info=True)
+            _model = None
+            _loaded = True
+            return False
+
+        dim = _model.get_sentence_embedding_dimension()
+        rows = []
+        try:
+            raw = _redis.cmd("HGETALL", _REDIS_KEY) or []
+        except (OSError, RuntimeError):
+            raw = []
+        it = iter(raw)
+        for field, blob in zip(it, it):
+            vec = _np.frombuffer(blob, dtype=_np.float32)
+            if vec.shape[0] == dim:
+                _hashes.append(field.decode())
+                rows.append(vec)
+        _vectors = _np.vstack(rows) if rows else _np.empty((0, dim), dtype=_np.float32)
+        _loaded = True
+        return True
+
+
+def nearest(text: str) -> Tuple[Optional[str], Optional[object]]:
+    """
+    Return (rule_hash of the most similar remembered rule or None, embedding of text).
+    The embedding is handed back so a miss can be remembered without re-encoding.
+    """
+    if not ENABLED or not _load():
+        return None, None
+    vec = _model.encode(text, normalize_embeddings=True).astype(_np.float32)
+    with _lock:
+        vectors, hashes = _vectors, list(_hashes)
+    if not hashes:
+        return None, vec
+    scores = vectors @ vec
+    best = int(scores.argmax())
+    if scores[best] >= THRESHOLD:
+        _log.debug("semantic cache hit %s (cos=%.3f)", hashes[best], scores[best])
+        return hashes[best], vec
+    return None, vec
+
+
+def remember(rule_hash: str, vec) -> None:
+    """Add an explained rule's embedding (from nearest()) to the index."""
+    global _vectors
+    if vec is None or _vectors is None:
+        return
+    with _lock:
+        if rule_hash in _hashes:
+            return
+        _vectors = _np.vstack([_vectors, vec[None, :]])
+        _hashes.append(rule_hash)
+    try:
+        _redis.hset(_REDIS_KEY, rule_hash, vec.tobytes())
+    except (OSError, RuntimeError):
+        pass
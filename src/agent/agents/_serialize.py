@@ -0,0 +1,32 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from agent.agents._json_utils import dumps
+
+_MAX_ENTRIES = 128
+
+# id(extraction) -> (extraction, indented JSON). Keeping a reference to the dict
+# pins its id, so a recycled id can never return another dict's JSON.
+_cache: "OrderedDict[int, Tuple[Dict[str, Any], str]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def extraction_json(extraction: Dict[str, Any]) -> str:
+    """
+    Indented JSON for an extraction, computed once per extraction object.
+    The same extraction is sent to explain/verify/rewrite/reflect/tests in one run;
+    extractions are treated as read-only once parsed.
+    """
+    key = id(extraction)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] is extraction:
+            _cache.move_to_end(key)
+            return entry[1]
+    text = dumps(extraction, indent=True)
+    with _lock:
+        _cache[key] = (extraction, text)
+        if len(_cache) > _MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return text
@@ -1,9 +1,16 @@
-import json
-from langchain_core.output_parsers import StrOutputParser
+from agent.agents._serialize import extraction_json
 from agent.prompts import DIFF_PROMPT
+from agent.agents._chains import chain_for
+from agent.agents._llm_cache import acached_invoke, cached_invoke
 
 def diff_rules(llm, old_extraction: dict, new_extraction: dict) -> str:
-    chain = DIFF_PROMPT | llm | StrOutputParser()
-    old_json = json.dumps(old_extraction, ensure_ascii=False, indent=2)
-    new_json = json.dumps(new_extraction, ensure_ascii=False, indent=2)
-    return chain.invoke({"old_json": old_json, "new_json": new_json}).strip()
+    chain = chain_for(DIFF_PROMPT, llm)
+    old_json = extraction_json(old_extraction)
+    new_json = extraction_json(new_extraction)
+    return cached_invoke(chain, {"old_json": old_json, "new_json": new_json}, ns="diff").strip()
+
+async def adiff_rules(llm, old_extraction: dict, new_extraction: dict) -> str:
+    chain = chain_for(DIFF_PROMPT, llm)
+    old_json = extraction_json(old_extraction)
+    new_json = extraction_json(new_extraction)
+    return (await acached_invoke(chain, {"old_json": old_json, "new_json": new_json}, ns="diff")).strip()
@@ -1,10 +1,12 @@
-import json
-from langchain_core.output_parsers import StrOutputParser
+from agent.agents._serialize import extraction_json
 from agent.prompts import EXPLAIN_PROMPT
+from agent.agents._chains import chain_for
+from agent.agents._llm_cache import acached_invoke, cached_invoke
 
 def explain_rule(llm, extraction: dict, context: str) -> str:
-    chain = EXPLAIN_PROMPT | llm | StrOutputParser()
-    extraction_json = json.dumps(extraction, ensure_ascii=False, indent=2)
-    return chain.invoke({"extraction_json": extraction_json, "context": context}).strip()
-
+    chain = chain_for(EXPLAIN_PROMPT, llm)
+    return cached_invoke(chain, {"extraction_json": extraction_json(extraction), "context": context}, ns="explain").strip()
 
+async def aexplain_rule(llm, extraction: dict, context: str) -> str:
+    chain = chain_for(EXPLAIN_PROMPT, llm)
+    return (await acached_invoke(chain, {"extraction_json": extraction_json(extraction), "context": context}, ns="explain")).strip()
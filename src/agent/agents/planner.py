@@ -1,18 +1,12 @@
-import json
-import logging
-from typing import List
-from langchain_core.output_parsers import StrOutputParser
-from agent.prompts import PLANNER_PROMPT
+from typing import Dict, List, Tuple
 
-logging.basicConfig(level=logging.DEBUG)
+_PLANS: Dict[str, Tuple[str, ...]] = {
+    "diff": ("parse", "parse", "diff"),
+    "tests": ("parse", "generate_tests"),
+    "verify": ("parse", "static_checks", "retrieve_context", "explain", "reflect", "verify", "rewrite"),
+    "explain": ("parse", "retrieve_context", "explain"),
+}
+_DEFAULT: Tuple[str, ...] = ("parse", "static_checks", "retrieve_context", "explain", "verify", "rewrite")
 
 def plan_steps(mode: str) -> List[str]:
-    if mode == "diff":
-        return ["parse", "parse", "diff"]
-    if mode == "tests":
-        return ["parse", "generate_tests"]
-    if mode == "verify":
-        return ["parse", "static_checks", "retrieve_context", "explain", "reflect", "verify", "rewrite"]
-    if mode == "explain":
-        return ["parse", "retrieve_context", "explain"]
-    return ["parse", "static_checks", "retrieve_context", "explain", "verify", "rewrite"]
+    return list(_PLANS.get(mode, _DEFAULT))
@@ -1,115 +1,289 @@
+import os
 import socket
+import threading
 from typing import Any, List, Optional, Union 
 
+# Optional C reply parser. When installed it replaces the pure-Python parse();
+# note it returns simple-string replies ("+OK") as bytes rather than str.
+try:
+    import hiredis
+except ImportError:
+    hiredis = None
+
+# Local Redis servers are usually reachable over a UNIX socket too, which skips
+# the TCP/IP stack for every small GET/SETEX. Override with REDIS_SOCKET.
+DEFAULT_UNIX_SOCKET = os.environ.get("REDIS_SOCKET", "/tmp/redis.sock")
+_LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+class _Connection:
+    """One socket plus its reply reader (hiredis when available, else a buffered file)."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self._rfile = None
+        self._reader = None
+        if hiredis is not None:
+            self._reader = hiredis.Reader()
+        else:
+            # one recv per buffer fill instead of one per byte
+            self._rfile = sock.makefile("rb", buffering=65536)
+
+    def read_line(self) -> bytes:
+        line = self._rfile.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis connection closed")
+        return line[:-2]
+            
+    def readexact(self, n: int) -> bytes:
+        data = self._rfile.read(n)
+        if len(data) != n:
+            raise ConnectionError("Redis connection closed")
+        return data
+
+    def parse(self):
+        # Iterative RESP reader: arrays push a [items, remaining] frame instead of
+        # recursing per element; finished frames are attached to their parent.
+        stack: List[list] = []
+        while True:
+            line = self.read_line()
+            prefix, rest = line[:1], line[1:]
+
+            if prefix == b"$":  # bulk string
+                ln = int(rest)
+                value = None if ln == -1 else self.readexact(ln + 2)[:-2]
+            elif prefix == b"*":  # array
+                n = int(rest)
+                if n > 0:
+                    stack.append([[], n])
+                    continue
+                value = None if n == -1 else []
+            elif prefix == b":":  # integer
+                value = int(rest)
+            elif prefix == b"+":  # simple string
+                value = rest.decode()
+            elif prefix == b"-":  # error
+                raise RuntimeError(f"Redis error: {rest.decode()}")
+            else:
+                raise RuntimeError(f"Unknown RESP prefix: {prefix!r}")
+
+            while stack:
+                frame = stack[-1]
+                frame[0].append(value)
+                frame[1] -= 1
+                if frame[1]:
+                    break
+                value = stack.pop()[0]
+            else:
+                return value
+
+    def read_reply(self):
+        if self._reader is None:
+            return self.parse()
+        reply = self._reader.gets()
+        while reply is False:
+            data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionError("Redis connection closed")
+            self._reader.feed(data)
+            try:
+                reply = self._reader.gets()
+            except hiredis.ProtocolError as e:
+                raise ConnectionError(f"Redis protocol error: {e}") from e
+        if isinstance(reply, hiredis.ReplyError):
+            raise RuntimeError(f"Redis error: {reply}")
+        return reply
+
+    def close(self) -> None:
+        if self._rfile is not None:
+            try:
+                self._rfile.close()
+            except OSError:
+                pass
+            self._rfile = None
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
 class MiniRedis:
     
-    def __init__(self, host: str = "127.0.0.1", port: int = 6379, timeout: float = 3.0):
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, timeout: float = 3.0,
+                 pool_size: int = 4, unix_socket_path: Optional[str] = None):
         self.host = host
         self.port = port
         self.timeout = timeout
+        self.pool_size = pool_size
+        if unix_socket_path is None and host in _LOCAL_HOSTS and os.path.exists(DEFAULT_UNIX_SOCKET):
+            unix_socket_path = DEFAULT_UNIX_SOCKET
+        self.unix_socket_path = unix_socket_path
+        # Idle keep-alive connections. Each command checks one out, so concurrent
+        # callers (threads, asyncio.to_thread) don't serialize on a single socket.
+        self._idle: List[_Connection] = []
+        self._lock = threading.Lock()
         
     
-    def connect(self):
+    def connect(self) -> socket.socket:
+        if self.unix_socket_path:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.settimeout(self.timeout)
+            try:
+                s.connect(self.unix_socket_path)
+                return s
+            except OSError:
+                # stale socket file or server not listening on it: use TCP from now on
+                s.close()
+                self.unix_socket_path = None
         s = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         s.settimeout(self.timeout)
         return s
         
-    def _encode(self, parts:List[Union[str, bytes, int]]):
-        out = [f"*{len(parts)}\r\n".encode()]
+    def _encode(self, parts:List[Union[str, bytes, int]], buf: Optional[bytearray] = None):
+        # Frame straight into one bytearray; pipelines pass a shared buffer.
+        out = bytearray() if buf is None else buf
+        out += b"*%d\r\n" % len(parts)
         for p in parts:
             if isinstance(p, int):
-                b = str(p).encode()
-            elif isinstance(p, bytes):
+                b = b"%d" % p
+            elif isinstance(p, (bytes, bytearray)):
                 b = p
             else:
                 b = p.encode()
-            out.append(f"${len(b)}\r\n".encode() + b + b"\r\n")
-        return b"".join(out)
-    
-    def read_line(self, s:socket.socket) -> bytes:
-        buff = bytearray()
-        while True:
-            ch = s.recv(1)
-            if not ch:
-                raise ConnectionError("Redis connection closed")
-            buff += ch
-            if len(buff) >= 2 and buff[-2:] == b"\r\n":
-                return bytes(buff[:-2])
-            
-    def readexact(self, s: socket.socket, n: int) -> bytes:
-        data = bytearray()
-        while len(data) < n:
-            chunk = s.recv(n - len(data))
-            if not chunk:
-                raise ConnectionError("Redis connection closed")
-            data += chunk
-        return bytes(data)
+            out += b"$%d\r\n" % len(b)
+            out += b
+            out += b"\r\n"
+        return out if buf is not None else bytes(out)
 
- 
-    def parse(self, s: socket.socket):
-            prefix = self.readexact(s, 1)
+    def _acquire(self) -> _Connection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return _Connection(self.connect())
 
-            if prefix == b"+":  # simple string
-                return self.read_line(s).decode()
+    def _release(self, conn: _Connection) -> None:
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
 
-            if prefix == b"-":  # error
-                err = self.read_line(s).decode()
-                raise RuntimeError(f"Redis error: {err}")
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
 
-            if prefix == b":":  # integer
-                return int(self.read_line(s))
+    def _execute(self, payload: Union[bytes, bytearray], count: int) -> List[Any]:
+        """Send an already-encoded payload and read `count` replies off the same connection."""
+        for attempt in (0, 1):
+            conn = self._acquire()
+            try:
+                conn.sock.sendall(payload)
+                replies: List[Any] = []
+                error: Optional[RuntimeError] = None
+                for _ in range(count):
+                    # keep draining after an error reply so the stream stays in sync
+                    try:
+                        replies.append(conn.read_reply())
+                    except RuntimeError as e:
+                        error = error or e
+                        replies.append(e)
+            except ConnectionError:
+                # stale keep-alive socket (server restart / idle close): reconnect once
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            except BaseException:
+                # timeouts etc. leave the stream out of sync, never reuse it
+                conn.close()
+                raise
+            self._release(conn)
+            if error is not None:
+                raise error
+            return replies
+        return []
+
+    def _send_recv(self, payload: Union[bytes, bytearray]):
+        return self._execute(payload, 1)[0]
 
-            if prefix == b"$":  # bulk string
-                ln = int(self.read_line(s))
-                if ln == -1:
-                    return None
-                data = self.readexact(s, ln)
-                self.readexact(s, 2)  # consume \r\n
-                return data
-
-            if prefix == b"*":  # array
-                n = int(self.read_line(s))
-                if n == -1:
-                    return None
-                return [self.parse(s) for _ in range(n)]
-
-            raise RuntimeError(f"Unknown RESP prefix: {prefix!r}")
-    
     def cmd(self, *parts):
-        payload = self._encode(list(parts))
-        s = self.connect()
-        try:
-            s.sendall(payload)
-            return self.parse(s)
-        finally:
-            s.close()
-     # Convenience methods
+        # generic path for commands without a precomputed header
+        return self._send_recv(self._encode(list(parts)))
+
+    def pipeline(self) -> "Pipeline":
+        return Pipeline(self)
+
+    # Constant RESP prefixes (array length + command name) for the commands
+    # this codebase issues; convenience methods only frame their arguments.
+    _GET_HDR = b"*2\r\n$3\r\nGET\r\n"
+    _SET_HDR = b"*3\r\n$3\r\nSET\r\n"
+    _SETEX_HDR = b"*4\r\n$5\r\nSETEX\r\n"
+    _HSET_HDR = b"*4\r\n$4\r\nHSET\r\n"
+    _HGETALL_HDR = b"*2\r\n$7\r\nHGETALL\r\n"
+
+    @staticmethod
+    def _bulk(p: Union[str, bytes, int]) -> bytes:
+        if isinstance(p, int):
+            p = b"%d" % p
+        elif isinstance(p, str):
+            p = p.encode()
+        return b"$%d\r\n%b\r\n" % (len(p), p)
+
+    # Convenience methods
     def get(self, key: str) -> Optional[bytes]:
-        return self.cmd("GET", key)  # type: ignore
+        return self._send_recv(self._GET_HDR + self._bulk(key))  # type: ignore
 
     def set(self, key: str, value: Union[str, bytes]) -> str:
-        if isinstance(value, str):
-            value = value.encode()
-        return self.cmd("SET", key, value)  # type: ignore
+        return self._send_recv(self._SET_HDR + self._bulk(key) + self._bulk(value))  # type: ignore
 
     def setex(self, key: str, ttl_seconds: int, value: Union[str, bytes]) -> str:
-        if isinstance(value, str):
-            value = value.encode()
-        return self.cmd("SETEX", key, ttl_seconds, value)  # type: ignore
+        return self._send_recv(
+            self._SETEX_HDR + self._bulk(key) + self._bulk(ttl_seconds) + self._bulk(value)
+        )  # type: ignore
 
     def hset(self, key: str, field: str, value: Union[str, bytes]) -> int:
-        if isinstance(value, str):
-            value = value.encode()
-        return int(self.cmd("HSET", key, field, value))  # type: ignore
+        return int(self._send_recv(
+            self._HSET_HDR + self._bulk(key) + self._bulk(field) + self._bulk(value)
+        ))  # type: ignore
 
     def hgetall(self, key: str) -> dict:
-        arr = self.cmd("HGETALL", key)
+        arr = self._send_recv(self._HGETALL_HDR + self._bulk(key))
         if arr is None:
             return {}
-        items = list(arr)  # type: ignore
-        out = {}
-        for i in range(0, len(items), 2):
-            k = items[i].decode()
-            v = items[i + 1]
-            out[k] = v.decode() if isinstance(v, (bytes, bytearray)) else v
-        return out
\ No newline at end of file
+        # HGETALL replies alternate field/value bulk strings; pair them without copying
+        it = iter(arr)  # type: ignore
+        return {k.decode(): v.decode() for k, v in zip(it, it)}
+
+
+class Pipeline:
+    """
+    Queue commands and send them in one write, reading all replies in one round-trip.
+    Any command name works: pipe.get(k), pipe.setex(k, ttl, v), ...
+    Replies are returned raw (bytes / int / list), in queue order.
+    """
+
+    def __init__(self, client: MiniRedis):
+        self._client = client
+        self._queue: List[tuple] = []
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def stub(*args):
+            self._queue.append((name.upper(), args))
+            return self
+
+        return stub
+
+    def execute(self) -> List[Any]:
+        if not self._queue:
+            return []
+        queue, self._queue = self._queue, []
+        payload = bytearray()
+        for name, args in queue:
+            self._client._encode([name, *args], payload)
+        return self._client._execute(payload, len(queue))
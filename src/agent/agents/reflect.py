@@ -1,26 +1,40 @@
-import json
+from agent.agents._json_utils import as_str_list, extract_json, loads
+from agent.agents._serialize import extraction_json
 import logging
-from langchain_core.output_parsers import StrOutputParser
+from typing import Any, Dict, Tuple
 from langchain_core.prompts import ChatPromptTemplate
 from .types import AgentResult
 from agent.prompts import REFLECT_PROMPT
+from agent.agents._chains import chain_for
+from agent.agents._llm_cache import acached_invoke_json, cached_invoke_json
 
-logging.basicConfig(level=logging.DEBUG)
+_log = logging.getLogger(__name__)
 
-def reflect(llm, extraction: dict, english: str) -> AgentResult:
-    chain = REFLECT_PROMPT | llm | StrOutputParser()
-    extraction_json = json.dumps(extraction, ensure_ascii=False, indent=2)
-    raw = chain.invoke({"extraction_json": extraction_json, "english": english}).strip()
+def _is_reflection(obj) -> bool:
+    return isinstance(obj, dict) and "ok" in obj
 
+def _to_result(raw: str) -> AgentResult:
     # minimal json recovery
-    s, e = raw.find("{"), raw.rfind("}")
-    if s != -1 and e != -1 and e > s:
-        raw = raw[s:e+1]
-    obj = json.loads(raw)
-    logging.debug("REFLECT:", obj)
+    obj = loads(extract_json(raw, "{", "}") or raw)
+    if _log.isEnabledFor(logging.DEBUG):
+        _log.debug("REFLECT: %s", obj)
     
 
     return AgentResult(
         ok=bool(obj.get("ok", False)),
-        issues=list(obj.get("issues", []))
-    )
\ No newline at end of file
+        issues=as_str_list(obj.get("issues", []))
+    )
+
+def reflect_call(llm, extraction: dict, english: str) -> Tuple[Any, Dict[str, Any], str]:
+    """(chain, inputs, cache namespace) of the reflect LLM call, for _llm_cache.prefetched()."""
+    return chain_for(REFLECT_PROMPT, llm), {"extraction_json": extraction_json(extraction), "english": english}, "reflect"
+
+def reflect(llm, extraction: dict, english: str) -> AgentResult:
+    chain, inputs, ns = reflect_call(llm, extraction, english)
+    raw = cached_invoke_json(chain, inputs, ns=ns, accept=_is_reflection).strip()
+    return _to_result(raw)
+
+async def areflect(llm, extraction: dict, english: str) -> AgentResult:
+    chain, inputs, ns = reflect_call(llm, extraction, english)
+    raw = await acached_invoke_json(chain, inputs, ns=ns, accept=_is_reflection)
+    return _to_result(raw.strip())
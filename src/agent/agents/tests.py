@@ -1,20 +1,25 @@
-import json
+from agent.agents._json_utils import extract_json, loads
+from agent.agents._serialize import extraction_json
 from typing import Any, List
-from langchain_core.output_parsers import StrOutputParser
 from agent.prompts import TESTS_PROMPT
+from agent.agents._chains import chain_for
+from agent.agents._llm_cache import acached_invoke_json, cached_invoke_json
+
+def _is_case_list(obj: Any) -> bool:
+    return isinstance(obj, list) and all(isinstance(case, dict) for case in obj)
 
 def _parse_json_array(text: str) -> List[Any]:
-    text = text.strip()
-    if text.startswith("[") and text.endswith("]"):
-        return json.loads(text)
-    s = text.find("[")
-    e = text.rfind("]")
-    if s != -1 and e != -1 and e > s:
-        return json.loads(text[s:e+1])
-    raise ValueError("Tests agent did not return valid JSON array.")
+    span = extract_json(text, "[", "]")
+    if span is None:
+        raise ValueError("Tests agent did not return valid JSON array.")
+    return loads(span)
 
 def generate_tests(llm, extraction: dict) -> List[dict]:
-    chain = TESTS_PROMPT | llm | StrOutputParser()
-    extraction_json = json.dumps(extraction, ensure_ascii=False, indent=2)
-    raw = chain.invoke({"extraction_json": extraction_json})
+    chain = chain_for(TESTS_PROMPT, llm)
+    raw = cached_invoke_json(chain, {"extraction_json": extraction_json(extraction)}, ns="tests", open_ch="[", close_ch="]", accept=_is_case_list)
+    return _parse_json_array(raw)
+
+async def agenerate_tests(llm, extraction: dict) -> List[dict]:
+    chain = chain_for(TESTS_PROMPT, llm)
+    raw = await acached_invoke_json(chain, {"extraction_json": extraction_json(extraction)}, ns="tests", open_ch="[", close_ch="]", accept=_is_case_list)
     return _parse_json_array(raw)
@@ -1,12 +1,12 @@
-import json
+from agent.agents._serialize import extraction_json
 import logging
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from agent.prompts import ENGLISH_TO_MVEL_PROMPT
+from agent.agents._chains import chain_for
+from agent.agents._llm_cache import cached_invoke
 from typing import List, Dict, Any
 
 def generate_mvel(llm, extraction: dict) -> List[dict]:
-    chain = ENGLISH_TO_MVEL_PROMPT | llm | StrOutputParser()
-    extraction_json = json.dumps(extraction, ensure_ascii=False, indent=2)
-    raw = chain.invoke({"extraction_json": extraction_json})
+    chain = chain_for(ENGLISH_TO_MVEL_PROMPT, llm)
+    raw = cached_invoke(chain, {"extraction_json": extraction_json(extraction)}, ns="translate")
     return raw
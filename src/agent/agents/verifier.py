@@ -1,56 +1,74 @@
-import json
-from typing import List, Dict, Any
-from langchain_core.output_parsers import StrOutputParser
+from agent.agents._json_utils import as_str_list, extract_json, loads
+from agent.agents._serialize import extraction_json
+from typing import List, Dict, Any, Optional, Tuple
 from agent.prompts import VERIFY_PROMPT, REWRITE_PROMPT
+from agent.agents._chains import chain_for
+from agent.agents import _fast_verify
+from agent.agents._llm_cache import acached_invoke, acached_invoke_json, cached_invoke, cached_invoke_json
+
+def _is_verdict(obj: Any) -> bool:
+    return isinstance(obj, dict) and "ok" in obj
 
 def _parse_json_only(text: str) -> Dict[str, Any]:
-    text = text.strip()
-    if text.startswith("{") and text.endswith("}"):
-        return json.loads(text)
-    s = text.find("{")
-    e = text.rfind("}")
-    if s != -1 and e != -1 and e > s:
-        return json.loads(text[s:e+1])
-    raise ValueError("Verifier did not return valid JSON.")
+    span = extract_json(text, "{", "}")
+    if span is None:
+        raise ValueError("Verifier did not return valid JSON.")
+    return loads(span)
 
-def verify_explanation(llm, extraction: dict, english: str) -> Dict[str, Any]:
-    chain = VERIFY_PROMPT | llm | StrOutputParser()
-    extraction_json = json.dumps(extraction, ensure_ascii=False, indent=2)
-    raw = chain.invoke({"extraction_json": extraction_json, "english": english})
+def _to_verdict(raw: str) -> Dict[str, Any]:
     verdict = _parse_json_only(raw)
     # normalize keys
     verdict.setdefault("ok", True)
     verdict.setdefault("missing", [])
     # Ensure missing entries are strings (LLM may return structured items)
-    cleaned_missing = []
-    for m in verdict.get("missing", []):
-        if isinstance(m, str):
-            cleaned_missing.append(m)
-        else:
-            try:
-                cleaned_missing.append(json.dumps(m, ensure_ascii=False))
-            except Exception:
-                cleaned_missing.append(str(m))
-    verdict["missing"] = cleaned_missing
+    verdict["missing"] = as_str_list(verdict.get("missing", []))
     verdict.setdefault("rewrite_needed", verdict.get("ok") is False)
     return verdict
 
-def rewrite_explanation(llm, extraction: dict, english: str, missing: List[str]) -> str:
-    chain = REWRITE_PROMPT | llm | StrOutputParser()
-    extraction_json = json.dumps(extraction, ensure_ascii=False, indent=2)
+def verify_call(llm, extraction: dict, english: str) -> Tuple[Any, Dict[str, Any], str]:
+    """(chain, inputs, cache namespace) of the verify LLM call, for _llm_cache.prefetched()."""
+    return chain_for(VERIFY_PROMPT, llm), {"extraction_json": extraction_json(extraction), "english": english}, "verify"
+
+def verify_explanation(llm, extraction: dict, english: str) -> Dict[str, Any]:
+    fast = _fast_verify.trivial_check(extraction, english)
+    if fast is not None:
+        return fast
+    chain, inputs, ns = verify_call(llm, extraction, english)
+    raw = cached_invoke_json(chain, inputs, ns=ns, accept=_is_verdict)
+    return _to_verdict(raw)
+
+async def averify_explanation(llm, extraction: dict, english: str) -> Dict[str, Any]:
+    fast = _fast_verify.trivial_check(extraction, english)
+    if fast is not None:
+        return fast
+    chain, inputs, ns = verify_call(llm, extraction, english)
+    raw = await acached_invoke_json(chain, inputs, ns=ns, accept=_is_verdict)
+    return _to_verdict(raw)
+
+def rewrite_explanation(llm, extraction: dict, english: str, missing: List[str],
+                        ok: Optional[bool] = None) -> str:
+    if _fast_verify.ENABLED and ok is not False and not missing:
+        # verifier found nothing to fix: keep the explanation rather than pay for a rewrite
+        return english
+    chain = chain_for(REWRITE_PROMPT, llm)
     # Ensure missing list elements are strings
-    missing_parts = []
-    for m in missing or []:
-        if isinstance(m, str):
-            missing_parts.append(m)
-        else:
-            try:
-                missing_parts.append(json.dumps(m, ensure_ascii=False))
-            except Exception:
-                missing_parts.append(str(m))
-
-    return chain.invoke({
-        "extraction_json": extraction_json,
+    missing_parts = as_str_list(missing)
+
+    return cached_invoke(chain, {
+        "extraction_json": extraction_json(extraction),
+        "english": english,
+        "missing": "\n".join(missing_parts) if missing_parts else "(none)"
+    }, ns="rewrite").strip()
+
+async def arewrite_explanation(llm, extraction: dict, english: str, missing: List[str],
+                               ok: Optional[bool] = None) -> str:
+    if _fast_verify.ENABLED and ok is not False and not missing:
+        return english
+    chain = chain_for(REWRITE_PROMPT, llm)
+    missing_parts = as_str_list(missing)
+
+    return (await acached_invoke(chain, {
+        "extraction_json": extraction_json(extraction),
         "english": english,
         "missing": "\n".join(missing_parts) if missing_parts else "(none)"
-    }).strip()
+    }, ns="rewrite")).strip()
@@ -1,6 +1,13 @@
 # agent/llm.py
+import os
+
 from langchain_ollama import ChatOllama
 
+# How long Ollama keeps the model (and its prompt KV cache) loaded after a call.
+# A run makes several calls back to back; without this the server may unload the
+# model between them and pay load + full prompt prefill again.
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
 
 def get_llm(model: str, temperature: float = 0.0) -> ChatOllama:
     """
@@ -15,5 +22,5 @@ def get_llm(model: str, temperature: float = 0.0) -> ChatOllama:
     """
     # ChatOllama will talk to the local Ollama server (default: http://localhost:11434)
     # No API keys needed.
-    return ChatOllama(model=model, temperature=temperature)
+    return ChatOllama(model=model, temperature=temperature, keep_alive=KEEP_ALIVE)
 
@@ -7,6 +7,8 @@ def span() -> str:
     return str(uuid.uuid4())
 
 def log(trace: Trace, name: str, status: str = "ok", summary: str = "", **data):
+    if not trace.enabled:
+        return
     payload = {"status": status}
     if summary:
         payload["summary"] = summary
@@ -2,16 +2,41 @@
 
 import json
 import os
+import threading
 import time
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
+
+from agent.agents._json_utils import dumps, loads
 
 MEM_DIR = "memory"
 USER_PROFILE = os.path.join(MEM_DIR, "user_profile.json")
 MAPPINGS = os.path.join(MEM_DIR, "mappings.json")
-REFLECT = os.path.join(os.path.dirname(__file__), "..", "memory.json")
+REFLECT = os.path.join(os.path.dirname(__file__), "..", "memory.jsonl")
+LEGACY_REFLECT = os.path.join(os.path.dirname(__file__), "..", "memory.json")
 
 MAX_MEM_ITEM_SIZE = 2000        # max chars for any single saved field
 MAX_CONTEXT_CHARS = 8000        # cap for assembled context
+MAX_REFLECT_ITEMS = 2000        # only the newest items are loaded back
+COMPACT_AT = 2 * MAX_REFLECT_ITEMS  # rewrite memory.jsonl down to the cap past this many lines
+
+# Defaults are shared constants (not rebuilt per call) so unchanged memory keeps
+# the same object identity and the context cache below can hit. Treat as read-only.
+_DEFAULT_PROFILE = {"tone": "non-technical", "style": "concise"}
+_DEFAULT_MAPPINGS = {"output_labels": {}, "field_definitions": {}}
+
+# path -> ((mtime_ns, version), parsed JSON); files are only re-read when they change
+_CACHE: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
+# Bumped by every in-process write, so an append that lands within the
+# filesystem's mtime granularity still invalidates the cached reflections.
+_version = 0
+_version_lock = threading.Lock()
+_reflect_lines = None  # lines in REFLECT, counted on first append; guarded by _version_lock
+
+# (ids of memory sections, options) -> (the sections themselves, formatted context)
+_CONTEXT_CACHE: Dict[tuple, Tuple[tuple, str]] = {}
+_CONTEXT_CACHE_SIZE = 16
+_context_lock = threading.Lock()
 
 
 def _now_ts() -> float:
@@ -43,47 +68,109 @@ def save_memory_item(item: Dict[str, Any]) -> None:
         if isinstance(v, str) and len(v) > MAX_MEM_ITEM_SIZE:
             safe_item[k] = _trim_text(v, MAX_MEM_ITEM_SIZE)
 
-    data: List[Dict[str, Any]] = []
-    if os.path.isfile(REFLECT):
-        try:
-            with open(REFLECT, "r", encoding="utf-8") as f:
-                data = json.load(f) or []
-        except Exception:
-            data = []
-
-    data.append(safe_item)
-
-    # Optional: cap file size by dropping oldest entries if too many
-    MAX_ITEMS = 2000
-    if len(data) > MAX_ITEMS:
-        data = data[-MAX_ITEMS:]
-
-    with open(REFLECT, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    global _version, _reflect_lines
+    _migrate_legacy_reflect()
+    with _version_lock:
+        if _reflect_lines is None:
+            _reflect_lines = _count_lines(REFLECT)
+        # Append-only JSON Lines: one write per item, independent of history size
+        with open(REFLECT, "a", encoding="utf-8") as f:
+            f.write(dumps(safe_item) + "\n")
+        _reflect_lines += 1
+        if _reflect_lines > COMPACT_AT:
+            _reflect_lines = _compact_reflect()
+        _version += 1
+
+
+def _count_lines(path: str) -> int:
+    try:
+        with open(path, "rb") as f:
+            return sum(1 for _ in f)
+    except OSError:
+        return 0
+
+
+def _compact_reflect() -> int:
+    """Rewrite REFLECT with only its newest MAX_REFLECT_ITEMS lines; returns the line count."""
+    with open(REFLECT, "rb") as f:
+        lines = f.readlines()[-MAX_REFLECT_ITEMS:]
+    tmp = REFLECT + ".tmp"
+    with open(tmp, "wb") as f:
+        f.writelines(lines)
+    os.replace(tmp, REFLECT)
+    return len(lines)
+
+
+def _migrate_legacy_reflect() -> None:
+    """One-shot conversion of the old memory.json array into memory.jsonl."""
+    if os.path.exists(REFLECT) or not os.path.isfile(LEGACY_REFLECT):
+        return
+    try:
+        with open(LEGACY_REFLECT, "r", encoding="utf-8") as f:
+            data = json.load(f) or []
+    except Exception:
+        data = []
+    tmp = REFLECT + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for item in data[-MAX_REFLECT_ITEMS:]:
+            f.write(dumps(item) + "\n")
+    os.replace(tmp, REFLECT)
+
+
+def _read_jsonl(path: str) -> List[Any]:
+    try:
+        stamp = (os.stat(path).st_mtime_ns, _version)
+    except OSError:
+        return []
+    cached = _CACHE.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    items: List[Any] = []
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(loads(line))
+            except ValueError:
+                continue  # torn write from an interrupted append
+    items = items[-MAX_REFLECT_ITEMS:]
+    _CACHE[path] = (stamp, items)
+    return items
+
+
+def load_reflections() -> List[Dict[str, Any]]:
+    _migrate_legacy_reflect()
+    return _read_jsonl(REFLECT)
 
 
 def _read_json(path: str, default: Any) -> Any:
+    try:
+        stamp = (os.stat(path).st_mtime_ns, 0)  # not written in-process
+    except OSError:
+        return default
+    cached = _CACHE.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
     try:
         with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+            data = json.load(f)
     except FileNotFoundError:
         return default
     except json.JSONDecodeError:
         return default
+    _CACHE[path] = (stamp, data)
+    return data
 
 
 def load_memory() -> Dict[str, Any]:
-    profile = _read_json(
-        USER_PROFILE,
-        {"tone": "non-technical", "style": "concise"},
-    )
+    profile = _read_json(USER_PROFILE, _DEFAULT_PROFILE)
 
-    mappings = _read_json(
-        MAPPINGS,
-        {"output_labels": {}, "field_definitions": {}},
-    )
+    mappings = _read_json(MAPPINGS, _DEFAULT_MAPPINGS)
 
 
+    # reflections are only read when a caller asks for them (see format_context_from_memory)
     return {"profile": profile, "mappings": mappings}
 
 
@@ -96,7 +183,32 @@ def format_context_from_memory(mem: Dict[str, Any], *,
     - By default, only include mappings (output_labels, field_definitions).
     - Optionally, include reflect items of particular types (whitelist).
       E.g., include_reflect_types=['glossary','domain_terms'] will include only those types.
+
+    Results are memoized on the identity of the memory sections, which stay the
+    same objects while the underlying files are unchanged. Reflect items are
+    loaded here, only when include_reflect_types is given and mem has none.
     """
+    if include_reflect_types and "reflect" not in mem:
+        mem = {**mem, "reflect": load_reflections()}
+    sections = (mem.get("profile"), mem.get("mappings"), mem.get("reflect"))
+    key = (
+        tuple(id(x) for x in sections),
+        tuple(include_reflect_types) if include_reflect_types is not None else None,
+        max_chars,
+    )
+    cached = _CONTEXT_CACHE.get(key)
+    if cached is not None and all(a is b for a, b in zip(cached[0], sections)):
+        return cached[1]
+
+    result = _format_context(mem, include_reflect_types, max_chars)
+    with _context_lock:
+        if len(_CONTEXT_CACHE) >= _CONTEXT_CACHE_SIZE:
+            _CONTEXT_CACHE.pop(next(iter(_CONTEXT_CACHE)))
+        _CONTEXT_CACHE[key] = (sections, result)
+    return result
+
+
+def _format_context(mem: Dict[str, Any], include_reflect_types: List[str], max_chars: int) -> str:
     if include_reflect_types is None:
         include_reflect_types = ["glossary", "domain_terms", "mappings"]
 
@@ -1,42 +1,6 @@
 from langchain_core.prompts import ChatPromptTemplate
 
 
-# -------------------------
-# PLANNER PROMPT
-# -------------------------
-# Decides WHICH STEPS the agent should run.
-# Must return JSON only.
-PLANNER_PROMPT = ChatPromptTemplate.from_messages([
-    (
-        "system",
-        "You are a planning agent. Output STRICT JSON only. "
-        "Do not explain your reasoning."
-    ),
-    (
-        "user",
-        "You are given a user mode and a list of allowed steps.\n\n"
-        "Allowed steps:\n"
-        "- parse\n"
-        "- static_checks\n"
-        "- retrieve_context\n"
-        "- explain\n"
-        "- verify\n"
-        "- rewrite\n"
-        "- generate_tests\n"
-        "- diff\n\n"
-        "Rules:\n"
-        "- mode=explain -> [parse, retrieve_context, explain]\n"
-        "- mode=verify -> [parse, static_checks, retrieve_context, explain, verify, rewrite]\n"
-        "- mode=tests -> [parse, generate_tests]\n"
-        "- mode=diff -> [parse, parse, diff]\n"
-        "- mode=agentic -> choose the safest default (like verify)\n\n"
-        "Return JSON only in this format:\n"
-        "{{ \"steps\": [\"step1\", \"step2\", ...] }}\n\n"
-        "mode: {mode}"
-    )
-])
-
-
 # -------------------------
 # EXPLAINER PROMPT
 # -------------------------
@@ -1,31 +1,115 @@
 # agent/runner.py
-import json
+import asyncio
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import logging
 from typing import List
 import hashlib
-from agent.agents.reflect import reflect
+from agent.agents.reflect import areflect, reflect_call
 from agent.llm import get_llm
 from agent.memory import load_memory, format_context_from_memory,save_memory_item
 from agent.tracing import Trace
 
-from agent.tools.mvel_parser_tool import parse_mvel_branches
+from agent.tools.mvel_parser_tool import canonical_source, parse_mvel_branches
 from agent.tools.static_checker_tool import run_static_checks
 from agent.tools.rag import retrieve_context
 
 from agent.agents.planner import plan_steps
-from agent.agents.explainer import explain_rule
-from agent.agents.verifier import verify_explanation, rewrite_explanation
-from agent.agents.diff import diff_rules
-from agent.agents.tests import generate_tests
+from agent.agents.explainer import aexplain_rule
+from agent.agents.verifier import arewrite_explanation, averify_explanation, verify_call
+from agent.agents.diff import adiff_rules
+from agent.agents.tests import agenerate_tests
 from agent.logging import log, span
-from hashlib import sha256
 from agent.agents.redis_mini import MiniRedis
-import traceback
+from agent.agents import _llm_cache, _semantic_cache
+from agent.agents._json_utils import dumpb, dumps, loads
 
+_log = logging.getLogger(__name__)
+
+# Rule hashes only key caches, so a fast non-cryptographic-use hash is enough;
+# BLAKE3 is several times faster than SHA-256. Fall back to SHA-256 without it.
+try:
+    from blake3 import blake3 as _hasher
+except ImportError:
+    _hasher = hashlib.sha256
+
+
+# Cache writes are best-effort and shouldn't hold up the reply: one writer thread
+# applies them in submission order after the run has moved on. Pending writes are
+# flushed at exit; when too many are queued, new ones are dropped.
+_cache_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-writer")
+_pending_writes = threading.BoundedSemaphore(256)
+atexit.register(_cache_writer.shutdown, wait=True)
+
+
+def _write_behind(fn, *args) -> None:
+    if not _pending_writes.acquire(blocking=False):
+        # writer is backed up (Redis slow or down): skip this write rather than
+        # queue without bound or block the caller, which is the shared event loop
+        _log.debug("cache writer backed up; dropping write")
+        return
+
+    def task():
+        try:
+            fn(*args)
+        except (OSError, RuntimeError):
+            _log.debug("background cache write failed", exc_info=True)
+        finally:
+            _pending_writes.release()
+
+    _cache_writer.submit(task)
+
+
+# Shared across runs: LLM clients per model and one pooled Redis client.
+_redis = MiniRedis(host="127.0.0.1", port=6379)
+
+
+@lru_cache(maxsize=8)
+def _get_llm(model: str):
+    return get_llm(model=model, temperature=0.0)  # deterministic
+
+
+# run() drives arun() on one long-lived event loop. A cached LLM client holds
+# async connections bound to the loop that opened them, so a fresh asyncio.run()
+# per call would strand them.
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="agent-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+async def _reflect_and_verify(llm, extraction: dict, english: str):
+    # reflect and verify both only read (extraction, english), so their LLM calls
+    # can overlap; both cached replies are looked up in one round trip first
+    calls = [reflect_call(llm, extraction, english), verify_call(llm, extraction, english)]
+    async with _llm_cache.prefetched(calls):
+        return await asyncio.gather(
+            areflect(llm, extraction, english),
+            averify_explanation(llm, extraction, english),
+            return_exceptions=True,
+        )
 
 
 def run(mode: str, mvel_texts: List[str], model: str, enable_trace: bool) -> str:
+    """Synchronous entry point; see arun(). Safe to call from several threads."""
+    coro = arun(mode=mode, mvel_texts=mvel_texts, model=model, enable_trace=enable_trace)
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
+
+
+async def arun(mode: str, mvel_texts: List[str], model: str, enable_trace: bool) -> str:
     """
-    Orchestrates the agent system.
+    Orchestrates the agent system. LLM steps are awaited on the model's async
+    client, and independent ones (reflect + verify) run concurrently.
 
     Args:
         mode: "explain" | "verify" | "tests" | "diff" | "agentic"
@@ -37,8 +121,10 @@ def run(mode: str, mvel_texts: List[str], model: str, enable_trace: bool) -> str
         Final output string (English explanation, diff explanation, or JSON test cases)
     """
     # 1) Initialize shared resources
-    llm = get_llm(model=model, temperature=0.0)  # deterministic
-    mem = load_memory() #load user settings and domain mapping and reflection
+    # run() callers share one event loop, so blocking file / Redis I/O below goes
+    # through asyncio.to_thread; done inline it would stall every in-flight run.
+    llm = _get_llm(model)
+    mem = await asyncio.to_thread(load_memory) #load user settings and domain mapping
     
    
     mem_context = format_context_from_memory({
@@ -46,32 +132,48 @@ def run(mode: str, mvel_texts: List[str], model: str, enable_trace: bool) -> str
         "mappings": mem.get("mappings")
     })
     
-    redis_client = MiniRedis(host="127.0.0.1", port=6379)
+    redis_client = _redis
 
     def hash_text(text: str) -> str:
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return _hasher(text.encode("utf-8")).hexdigest()
     
     def get_cached_explanation(rule_hash: str) -> str | None:
-        key = f"mvel:cache:explain:{rule_hash}"
-        raw = redis_client.get(key)
+        if rule_hash in prefetched_explanations:
+            raw = prefetched_explanations.pop(rule_hash)
+        else:
+            raw = redis_client.get(f"mvel:cache:explain:{rule_hash}")
         if raw is None:
             return None
         return raw.decode("utf-8")
-    
+
     def get_cached_parse(rule_hash: str) -> dict | None:
-        key = f"mvel:cache:parse:{rule_hash}"
-        raw = redis_client.get(key)
+        # one round trip for both per-rule caches; the explain entry is kept for the explain step
+        pipe = redis_client.pipeline()
+        pipe.get(f"mvel:cache:parse:{rule_hash}")
+        pipe.get(f"mvel:cache:explain:{rule_hash}")
+        raw, prefetched_explanations[rule_hash] = pipe.execute()
         if raw is None:
             return None
-        return json.loads(raw.decode("utf-8"))
+        return loads(raw)
     
     def set_cached_parse(rule_hash: str, parsed: dict, ttl_seconds: int = 7 * 24 * 3600) -> None:
         key = f"mvel:cache:parse:{rule_hash}"
-        redis_client.setex(key, ttl_seconds, json.dumps(parsed))
+        _write_behind(redis_client.setex, key, ttl_seconds, dumpb(parsed))
         
     def set_cached_explanation(rule_hash: str, explanation: str, ttl_seconds: int = 24 * 3600) -> None:
         key = f"mvel:cache:explain:{rule_hash}"
-        redis_client.setex(key, ttl_seconds, explanation)
+        _write_behind(redis_client.setex, key, ttl_seconds, explanation)
+
+    def parse_and_cache(text: str) -> tuple:
+        # key on the canonical form so formatting-only edits reuse cached parse/explain
+        src = canonical_source(text)
+        h = hash_text(src)
+        # parse cache; only parse on a miss
+        parsed = get_cached_parse(h)
+        if parsed is None:
+            parsed = parse_mvel_branches(text)
+            set_cached_parse(h, parsed)
+        return src, h, parsed
     
 
     trace = Trace(enabled=enable_trace)
@@ -87,30 +189,42 @@ def run(mode: str, mvel_texts: List[str], model: str, enable_trace: bool) -> str
     english: str = ""           # holds the current natural-language output
     verdict: dict = {}          # holds verifier output when used
     static_issues: List[str] = []
+    prefetched_verdict: dict | None = None  # verify result computed alongside reflect
+    prefetched_explanations: dict = {}      # rule_hash -> raw explain cache entry fetched at parse
+    prefetched_parses: List[tuple] = []     # parse_and_cache() results computed up front
+
+    # Several parse steps (diff mode) are independent: overlap each input's
+    # cache round trip and parse instead of running them back to back.
+    n_parses = min(steps.count("parse"), len(mvel_texts))
+    if n_parses > 1:
+        prefetched_parses = list(await asyncio.gather(
+            *(asyncio.to_thread(parse_and_cache, t) for t in mvel_texts[:n_parses])
+        ))
 
     # 4) Execute the plan
     rule_hash: str | None = None
-    for step in steps:
+    rule_src: str = ""
+    for i, step in enumerate(steps):
         if step == "translate":
             english = mvel_texts
             mvel = generate_mvel(english)
             return mvel
         if step == "parse":
             s = span()
-            rule_hash = hash_text(mvel_texts[0])
-            extraction = parse_mvel_branches(mvel_texts[0])
-            # parse cache
-            parsed = get_cached_parse(rule_hash)
-            if parsed is None:
-                parsed = extraction
-                set_cached_parse(rule_hash, extraction)
-            log(trace, "parse", span_id=s, summary=f"Parsed rule {parsed}",
-                index=0,
-                rule_hash=rule_hash,
-                branches=len(parsed.get("branches", [])),
-                outputs=parsed.get("outputs", []),
-                cache=parsed
-            )
+            # each parse step consumes the next input (diff mode parses old, then new)
+            idx = min(len(extractions), len(mvel_texts) - 1)
+            if idx < len(prefetched_parses):
+                rule_src, rule_hash, parsed = prefetched_parses[idx]
+            else:
+                rule_src, rule_hash, parsed = await asyncio.to_thread(parse_and_cache, mvel_texts[idx])
+            if trace.enabled:  # skip formatting the whole extraction when not tracing
+                log(trace, "parse", span_id=s, summary=f"Parsed rule {parsed}",
+                    index=idx,
+                    rule_hash=rule_hash,
+                    branches=len(parsed.get("branches", [])),
+                    outputs=parsed.get("outputs", []),
+                    cache=parsed
+                )
             extractions.append(parsed)
 
                         
@@ -128,7 +242,7 @@ def run(mode: str, mvel_texts: List[str], model: str, enable_trace: bool) -> str
         elif step == "retrieve_context":
             # Simple RAG + memory context
             # Uses first MVEL text as query signal (good enough for POC)
-            rag = retrieve_context(mvel_texts[0] if mvel_texts else "", kb_dir="dir")
+            rag = await asyncio.to_thread(retrieve_context, mvel_texts[0] if mvel_texts else "", kb_dir="dir")
             s = span()
             log(trace, "action:start", status="running", span_id=s, summary="Retrieve context")
             pieces = []
@@ -151,57 +265,79 @@ def run(mode: str, mvel_texts: List[str], model: str, enable_trace: bool) -> str
                 continue
 
             if rule_hash:
-                cached = get_cached_explanation(rule_hash)
+                cached = get_cached_explanation(rule_hash)  # prefetched by the parse step: no I/O
                 if cached:
-                    log(trace, "explain", span_id=s, summary="Used cached explanation", english_chars=len(english), cache="hit")
+                    if trace.enabled:
+                        log(trace, "explain", span_id=s, summary="Used cached explanation", english_chars=len(english), cache="hit")
                     # use cached explanation but continue pipeline so downstream steps can run
                     english = cached
                 else:
-                    english = explain_rule(llm, extractions[-1], context)
-                    log(trace, "explain", span_id=s, summary="{english}")
+                    near_hash, rule_vec = None, None
+                    if _semantic_cache.ENABLED:
+                        near_hash, rule_vec = await asyncio.to_thread(_semantic_cache.nearest, rule_src)
+                    english = await asyncio.to_thread(get_cached_explanation, near_hash) if near_hash else None
+                    if english:
+                        log(trace, "explain", span_id=s, summary="Used explanation of a near-identical rule", near_hash=near_hash, cache="semantic")
+                    else:
+                        english = await aexplain_rule(llm, extractions[-1], context)
+                        log(trace, "explain", span_id=s, summary="{english}")
+                        if rule_vec is not None:
+                            await asyncio.to_thread(_semantic_cache.remember, rule_hash, rule_vec)
                     set_cached_explanation(rule_hash, english)        
-            log(trace, "explain", span_id=s, summary="Generated explanation", english_chars=len(english), cache="miss")
-            log(trace, "action:end", span_id=s, summary="Explain complete")
+            if trace.enabled:
+                log(trace, "explain", span_id=s, summary="Generated explanation", english_chars=len(english), cache="miss")
+                log(trace, "action:end", span_id=s, summary="Explain complete")
         elif step == "verify":
             if not extractions or not english:
                 verdict = {"ok": False, "missing": ["verify: missing extraction or english"], "rewrite_needed": True}
+            elif prefetched_verdict is not None:
+                verdict = prefetched_verdict
+                prefetched_verdict = None
             else:
-                verdict = verify_explanation(llm, extractions[-1], english)
+                verdict = await averify_explanation(llm, extractions[-1], english)
             log(trace, "verify", summary="Verification complete", **verdict)
 
         elif step == "rewrite":
             # Only rewrite if verifier says it's not OK
             if verdict.get("ok") is False and extractions and english:
-                english = rewrite_explanation(llm, extractions[-1], english, verdict.get("missing", []))
+                english = await arewrite_explanation(llm, extractions[-1], english, verdict.get("missing", []), ok=verdict.get("ok"))
                 set_cached_explanation(rule_hash, english)
                 log(trace, "rewrite", summary="Rewrote explanation", english_chars=len(english))
-                trace.log_step("rewrite", {"english_chars": len(english)})
+                trace.log_step("rewrite", lambda: {"english_chars": len(english)})
             else:
-                trace.log_step("rewrite_skipped", {"ok": verdict.get("ok", True)})
+                trace.log_step("rewrite_skipped", lambda: {"ok": verdict.get("ok", True)})
                 log(trace, "rewrite_skipped", status="skipped", summary="Rewrite not needed", ok=verdict.get("ok", True))
         elif step == "reflect":
             try:
-                refl = reflect(llm, extractions[-1], english)
-                trace.log_step("reflect", {"issues": len(refl.issues)})
-                save_memory_item({"type": "reflection_issue", "issues": refl.issues})
+                if i + 1 < len(steps) and steps[i + 1] == "verify" and extractions and english:
+                    refl, verdict_or_exc = await _reflect_and_verify(llm, extractions[-1], english)
+                    # a failed verify is simply redone (and surfaces its error) in the verify step
+                    if not isinstance(verdict_or_exc, BaseException):
+                        prefetched_verdict = verdict_or_exc
+                    if isinstance(refl, BaseException):
+                        raise refl
+                else:
+                    refl = await areflect(llm, extractions[-1], english)
+                trace.log_step("reflect", lambda: {"issues": len(refl.issues)})
+                await asyncio.to_thread(save_memory_item, {"type": "reflection_issue", "issues": refl.issues})
             except Exception:
-                traceback.print_exc()
+                _log.exception("reflect step failed")
         elif step == "generate_tests":
             if not extractions:
                 tests_json = [{"name": "error", "input": {}, "expected": {}, "note": "No extraction available"}]
             else:
-                tests_json = generate_tests(llm, extractions[-1])
+                tests_json = await agenerate_tests(llm, extractions[-1])
 
-            english = json.dumps(tests_json, ensure_ascii=False, indent=2)
-            trace.log_step("generate_tests", {"count": len(tests_json)})
+            english = dumps(tests_json, indent=True)
+            trace.log_step("generate_tests", lambda: {"count": len(tests_json)})
 
         elif step == "diff":
             if len(extractions) < 2:
                 english = "Diff requires two parsed rules, but fewer were available."
-                trace.log_step("diff_fallback", {"reason": "need 2 extractions", "got": len(extractions)})
+                trace.log_step("diff_fallback", lambda: {"reason": "need 2 extractions", "got": len(extractions)})
             else:
-                english = diff_rules(llm, extractions[0], extractions[1])
-                trace.log_step("diff", {"english_chars": len(english)})
+                english = await adiff_rules(llm, extractions[0], extractions[1])
+                trace.log_step("diff", lambda: {"english_chars": len(english)})
 
         else:
             trace.log_step("unknown_step", {"step": step})
@@ -211,6 +347,7 @@ def run(mode: str, mvel_texts: List[str], model: str, enable_trace: bool) -> str
         english = "No output was produced. Check the plan and earlier steps."
 
     trace.finish(english)
-    trace.write()
+    if trace.enabled:
+        await asyncio.to_thread(trace.write)
     result = {'output': english, 'trace': trace.to_dict()}
     return result
@@ -1,186 +1,271 @@
 import re
-from typing import Any, Dict, List
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 # --- Comments ---
 RE_LINE_COMMENT = re.compile(r"//.*?$", re.MULTILINE)
 RE_BLOCK_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
 
-# --- Tokens / identifiers ---
-IDENT_RE = re.compile(r"\b[a-zA-Z_]\w*(?:\.[a-zA-Z_]\w*)*\b")
-
 # --- Assignments (single statement) ---
-ASSIGN_RE = re.compile(r"^\s*([a-zA-Z_]\w*(?:\.[a-zA-Z_]\w*)*)\s*=\s*(.+?)\s*$")
-
-# --- Strip string literals for brace counting / identifier extraction ---
-RE_STRINGS = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+# DOTALL: a statement wrapped inside parentheses spans lines
+ASSIGN_RE = re.compile(r"^\s*([a-zA-Z_]\w*(?:\.[a-zA-Z_]\w*)*)\s*=\s*(.+?)\s*$", re.DOTALL)
+
+# --- Source tokens: string literals, identifiers and structural characters ---
+# One alternation drives the whole parse. Strings are matched first so
+# identifiers, braces and ';' inside quotes are consumed with the literal;
+# a literal never spans lines, so a stray quote can't swallow the rest of the rule.
+TOKEN_RE = re.compile(
+    r'(?P<STR>"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')'
+    r"|(?P<ID>\b[a-zA-Z_]\w*(?:\.[a-zA-Z_]\w*)*\b)"
+    r"|(?P<LB>\{)"
+    r"|(?P<RB>\})"
+    r"|(?P<LP>\()"
+    r"|(?P<RP>\))"
+    r"|(?P<END>[;\n])"
+)
+
+# --- Block headers: if (...) / else if (...) / else / def name(...) ---
+HEADER_RE = re.compile(r"(?:else\s+)?if\b|else\b|def\b")
+
+# --- Fast path for the common flat shape: if (...) {...} else if (...) {...} else {...} ---
+# Each match is one branch whose body has no nested braces; string literals may
+# contain anything but a newline. Patterns are written as unrolled loops
+# (plain-char run, then literal + run, ...) so the regex engine doesn't try an
+# alternation at every character.
+_STR = r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"|\'[^\'\\\n]*(?:\\.[^\'\\\n]*)*\''
+FLAT_RE = re.compile(
+    r"\s*((?:else\s+)?if\s*\([^{};\"']*(?:(?:" + _STR + r")[^{};\"']*)*\)|else)\s*"
+    r"\{([^{}\"']*(?:(?:" + _STR + r")[^{}\"']*)*)\}\s*"
+)
+FLAT_STMT_RE = re.compile(r"[^;\n\"']*(?:(?:" + _STR + r")[^;\n\"']*)*")
+STRINGS_RE = re.compile(_STR)
+IDENT_RE = re.compile(r"\b[a-zA-Z_]\w*(?:\.[a-zA-Z_]\w*)*\b")
 
-KEYWORDS = {
+KEYWORDS = frozenset({
     "if", "else", "return", "true", "false", "null", "new",
     "for", "while", "switch", "case", "break", "continue", "def",
-}
+})
 
 def strip_comments(src: str) -> str:
     src = RE_BLOCK_COMMENT.sub("", src)
     src = RE_LINE_COMMENT.sub("", src)
     return src
 
-def _count_braces(s: str) -> int:
-    # Remove string literals so braces inside quotes don't break depth
-    s = RE_STRINGS.sub("", s)
-    return s.count("{") - s.count("}")
-
-def _split_statements(text: str) -> List[str]:
+@lru_cache(maxsize=256)
+def canonical_source(mvel_text: str) -> str:
+    """
+    Rule text with comments, indentation and blank lines removed. The parser
+    ignores all of these, so rules that differ only in formatting share the
+    same canonical form (and cache key). Whitespace inside a line is kept,
+    since it may sit inside a string literal.
+    """
+    lines = (line.strip() for line in strip_comments(mvel_text).splitlines())
+    return "\n".join(line for line in lines if line)
+
+def _header_condition(header: str) -> str:
+    """Condition of an if/else-if header ("DEFAULT" for a plain else)."""
+    if header.startswith("else") and not header[4:].lstrip().startswith("if"):
+        return "DEFAULT"
+    if "(" in header and ")" in header:
+        return header[header.find("(") + 1 : header.rfind(")")].strip()
+    return ""
+
+def _split_header(stmt: str) -> Tuple[str, str]:
+    """Split a brace-less branch like "if (a) x = 1" into (condition, statement)."""
+    if stmt.startswith("else") and not stmt[4:].lstrip().startswith("if"):
+        return "DEFAULT", stmt[4:].strip()
+    open_at = stmt.find("(")
+    if open_at == -1:
+        return "", ""
+    depth = 0
+    for j in range(open_at, len(stmt)):
+        if stmt[j] == "(":
+            depth += 1
+        elif stmt[j] == ")":
+            depth -= 1
+            if depth == 0:
+                return stmt[open_at + 1 : j].strip(), stmt[j + 1 :].strip()
+    return stmt[open_at + 1 :].strip(), ""
+
+def _parens_closed(text: str) -> bool:
+    # same rule as the general parser: a stray ')' never goes below zero
+    depth = 0
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")" and depth:
+            depth -= 1
+    return depth == 0
+
+def _parse_flat(src: str) -> Optional[Dict[str, Any]]:
     """
-    Split text into statements by ';' (lightweight).
-    Note: does not perfectly handle semicolons inside strings, but OK for most business rules.
+    Parse a rule that is nothing but a flat if / else if / else chain with
+    brace-free bodies, using C-level regex sweeps. Returns None for anything
+    else (globals, nesting, brace-less branches, statements spanning lines),
+    which the general parser handles; results match it on the inputs accepted.
     """
-    parts = [p.strip() for p in text.split(";")]
-    return [p for p in parts if p]
+    branches: List[Dict[str, Any]] = []
+    outputs = set()
+    pos, end = 0, len(src)
+    while pos < end:
+        m = FLAT_RE.match(src, pos)
+        if m is None or m.end() == pos:
+            return None
+        pos = m.end()
+        actions: List[str] = []
+        for stmt in FLAT_STMT_RE.findall(m.group(2)):
+            stmt = stmt.strip()
+            if not stmt:
+                continue
+            if HEADER_RE.match(stmt):
+                return None  # nested / brace-less branch
+            if "(" in stmt or ")" in stmt:
+                bare = STRINGS_RE.sub("", stmt) if ("\"" in stmt or "'" in stmt) else stmt
+                if not _parens_closed(bare):
+                    return None  # statement continues past ';' / newline
+            a = ASSIGN_RE.match(stmt)
+            if a:
+                outputs.add(a.group(1).strip())
+            actions.append(stmt)
+        branches.append({"condition": _header_condition(m.group(1)), "actions": actions})
+    if not branches:
+        return None
+
+    # blank out literals (a space keeps word boundaries) so quoted words aren't variables
+    bare_src = STRINGS_RE.sub(" ", src) if ("\"" in src or "'" in src) else src
+    variables = set(IDENT_RE.findall(bare_src))
+    variables -= KEYWORDS
+    variables -= outputs
+    return {
+        "globals": [],
+        "branches": branches,
+        "variables": sorted(variables),
+        "outputs": sorted(outputs),
+    }
 
+@lru_cache(maxsize=256)
 def parse_mvel_branches(mvel_text: str) -> Dict[str, Any]:
     """
-    Lightweight MVEL-ish parser:
+    Lightweight MVEL-ish parser (memoized per rule text; treat the result as read-only):
     - Detects if / else if / else branches (including patterns like "} else if")
     - Tracks brace depth to handle nested blocks
     - Captures actions inside each branch:
         * assignments (tracks outputs)
         * non-assignment statements (e.g., addReason(...), list.add(...), return false)
     - Captures top-level statements outside branches as "globals"
-    - FIXES:
+    - Single forward pass over the comment-stripped source: TOKEN_RE yields
+      string literals, identifiers and { } ( ) ; newline, and a small state
+      machine cuts statements at ';' / newline / braces (outside parentheses)
         * Handles one-line blocks: if (...) { a; b; } tail;
-        * Strips string literals before extracting identifiers (prevents "velocity" from quotes)
-        * Captures trailing statements after inline block close as globals
+        * Handles headers split from their brace: if (...)\n{
+        * Ignores identifiers, braces and ';' inside string literals
+        * Skips def bodies
     """
     src = strip_comments(mvel_text)
+    flat = _parse_flat(src)
+    if flat is not None:
+        return flat
 
     branches: List[Dict[str, Any]] = []
     variables = set()
     outputs = set()
     globals_actions: List[str] = []
 
-    lines = src.splitlines()
-    i = 0
-
-    def record_idents(text: str) -> None:
-        # Remove string literals so words inside quotes don't become "variables"
-        text = RE_STRINGS.sub("", text)
-        for ident in IDENT_RE.findall(text):
-            if ident not in KEYWORDS:
-                variables.add(ident)
-
-    def record_statement(stmt: str, actions_list: List[str]) -> None:
+    # Open blocks: [brace depth to close at, condition, actions]. Only top-level
+    # if/else open a branch; a def body has actions=None and its statements are
+    # dropped. Other braces (nested ifs, loops) only change depth, so their
+    # statements land in the enclosing branch.
+    blocks: List[list] = []
+    depth = 0
+    parens = 0
+    start = 0  # start of the pending statement
+
+    def emit(stmt: str) -> None:
+        if blocks:
+            actions = blocks[-1][2]
+            if actions is None:
+                return
+        else:
+            actions = globals_actions
         m = ASSIGN_RE.match(stmt)
         if m:
             outputs.add(m.group(1).strip())
-        actions_list.append(stmt)
-
-    def parse_inline_block(line_text: str, actions_list: List[str]) -> None:
-        """
-        Extract and parse statements inside the first {...} on the same line,
-        and also capture any trailing statements after the closing '}' as globals.
-        """
-        # Inside {...}
-        inner = line_text[line_text.find("{") + 1 : line_text.rfind("}")].strip()
-        if inner:
-            for stmt in _split_statements(inner):
-                record_idents(stmt)
-                record_statement(stmt, actions_list)
-
-        # After the closing '}': treat as top-level statements
-        tail = line_text[line_text.rfind("}") + 1 :].strip()
-        if tail:
-            for stmt in _split_statements(tail):
-                record_idents(stmt)
-                record_statement(stmt, globals_actions)
-
-    while i < len(lines):
-        raw = lines[i].strip()
-        # normalize: allow patterns like "} else if" / "} else"
-        line = raw.lstrip("}").strip()
-
-        # Record identifiers for visibility
-        record_idents(line)
-
-        is_if = line.startswith("if")
-        is_elif = line.startswith("else if")
-        is_else = line.startswith("else")
-
-        if is_if or is_elif:
-            condition = ""
-            if "(" in line and ")" in line:
-                condition = line[line.find("(") + 1 : line.rfind(")")].strip()
-
-            actions: List[str] = []
-
-            # If block is inline: if (...) { ... } (possibly with tail statements)
-            if "{" in line and "}" in line:
-                brace_depth = _count_braces(line)
-                if brace_depth == 0:
-                    parse_inline_block(line, actions)
+        actions.append(stmt)
+
+    for m in TOKEN_RE.finditer(src):
+        kind = m.lastgroup
+        if kind == "ID":
+            # identifiers repeat a lot within a rule; a membership test is
+            # cheaper than a set.add() call for ones already seen
+            ident = m.group()
+            if ident in variables or ident in KEYWORDS:
+                continue
+            variables.add(ident)
+        elif kind == "LP":
+            parens += 1
+        elif kind == "RP":
+            if parens:
+                parens -= 1
+        elif kind == "END":
+            if parens:
+                continue  # for (;;) / a condition wrapped across lines
+            if m.start() == start:
+                # empty statement ("...;\n", "}\n", blank line): nothing to slice
+                start = m.end()
+                continue
+            stmt = src[start:m.start()].strip()
+            if stmt and HEADER_RE.match(stmt):
+                if m.group() == "\n":
+                    continue  # header whose "{" is on the next line
+                if not blocks and not stmt.startswith("def"):
+                    # brace-less branch: if (a) x = 1;
+                    condition, body = _split_header(stmt)
+                    actions: List[str] = []
+                    if body:
+                        b = ASSIGN_RE.match(body)
+                        if b:
+                            outputs.add(b.group(1).strip())
+                        actions.append(body)
                     branches.append({"condition": condition, "actions": actions})
-                    i += 1
+                    start = m.end()
                     continue
-
-            # Multi-line block
-            brace_depth = _count_braces(line)
-            i += 1
-
-            while i < len(lines) and brace_depth > 0:
-                lraw = lines[i].strip()
-                brace_depth += _count_braces(lraw)
-
-                # Remove outer braces, keep content
-                content = lraw.strip().strip("{}").strip()
-                if content:
-                    for stmt in _split_statements(content):
-                        record_idents(stmt)
-                        record_statement(stmt, actions)
-
-                i += 1
-
+            if stmt:
+                emit(stmt)
+            start = m.end()
+        elif kind == "LB":
+            stmt = src[start:m.start()].strip() if m.start() > start else ""
+            start = m.end()
+            parens = 0
+            depth += 1
+            if stmt and HEADER_RE.match(stmt) and (not blocks or blocks[-1][2] is None):
+                if stmt.startswith("def"):
+                    blocks.append([depth, None, None])
+                elif not blocks:
+                    blocks.append([depth, _header_condition(stmt), []])
+                continue
+            if stmt:
+                emit(stmt)
+        elif kind == "RB":
+            stmt = src[start:m.start()].strip() if m.start() > start else ""
+            start = m.end()
+            parens = 0
+            if stmt:
+                emit(stmt)
+            if blocks and blocks[-1][0] == depth:
+                _, condition, actions = blocks.pop()
+                if actions is not None:
+                    branches.append({"condition": condition, "actions": actions})
+            if depth:
+                depth -= 1
+
+    stmt = src[start:].strip()
+    if stmt:
+        emit(stmt)
+    # Unterminated blocks still contribute what was parsed
+    while blocks:
+        _, condition, actions = blocks.pop()
+        if actions is not None:
             branches.append({"condition": condition, "actions": actions})
-            continue
-
-        if is_else:
-            actions: List[str] = []
-
-            # Inline else: else { ... } tail;
-            if "{" in line and "}" in line:
-                brace_depth = _count_braces(line)
-                if brace_depth == 0:
-                    parse_inline_block(line, actions)
-                    branches.append({"condition": "DEFAULT", "actions": actions})
-                    i += 1
-                    continue
-
-            # Multi-line else block
-            brace_depth = _count_braces(line)
-            i += 1
-
-            while i < len(lines) and brace_depth > 0:
-                lraw = lines[i].strip()
-                brace_depth += _count_braces(lraw)
-
-                content = lraw.strip().strip("{}").strip()
-                if content:
-                    for stmt in _split_statements(content):
-                        record_idents(stmt)
-                        record_statement(stmt, actions)
-
-                i += 1
-
-            branches.append({"condition": "DEFAULT", "actions": actions})
-            continue
-
-        # Capture top-level statements outside branches (globals/defaults/helpers)
-        if line and not line.startswith(("def ", "def\t")):
-            content = line.strip().strip("{}").strip()
-            if content:
-                for stmt in _split_statements(content):
-                    record_idents(stmt)
-                    record_statement(stmt, globals_actions)
-
-        i += 1
 
     # Optional: remove outputs from variables to reduce noise
     for out in outputs:
@@ -1,49 +1,123 @@
 import os 
-from typing import List, Tuple 
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple 
+
+# Optional C automaton for multi-keyword search: one pass per document instead
+# of one substring scan per keyword per line.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# kb_path -> (signature, docs). The signature is (name, mtime_ns, size) of every
+# file, so adding, removing or editing a KB file is picked up on the next call.
+_KB_CACHE: Dict[str, Tuple[tuple, List[Tuple[str, str]]]] = {}
+_kb_lock = threading.Lock()
+
 def read_files(kb_dir: str):
+    """(name, text) for each file in the KB dir; re-read only when the dir changes. Treat as read-only."""
     kb_path = os.path.join(BASE_DIR, kb_dir)
-    docs = []
     if not os.path.isdir(kb_path):
-        return docs
+        return []
+
+    # one scandir pass yields names, types and stat info for the signature;
+    # DirEntry caches both, so there is no separate isfile()/stat() per file
+    paths = {}
+    entries = []
+    with os.scandir(kb_path) as it:
+        for e in it:
+            if e.is_file():
+                st = e.stat()
+                entries.append((e.name, st.st_mtime_ns, st.st_size))
+                paths[e.name] = e.path
+    entries.sort()
+    sig = tuple(entries)
 
-    for name in os.listdir(kb_path):
-        path = os.path.join(kb_path, name)
-        if os.path.isfile(path):
-            with open(path, "r", encoding="utf-8", errors="replace") as f:
-                docs.append((name, f.read()))
+    with _kb_lock:
+        cached = _KB_CACHE.get(kb_path)
+    if cached is not None and cached[0] == sig:
+        return cached[1]
+
+    docs = [
+        (name, Path(paths[name]).read_text(encoding="utf-8", errors="replace"))
+        for name, _, _ in entries
+    ]
+    with _kb_lock:
+        _KB_CACHE[kb_path] = (sig, docs)
     return docs
 
 
+def _line_at(text: str, pos: int) -> Tuple[int, str]:
+    """(start offset, text) of the line containing text[pos]."""
+    start = text.rfind("\n", 0, pos) + 1
+    end = text.find("\n", pos)
+    return start, text[start:] if end == -1 else text[start:end]
+
+
 #return context to llm
 def retrieve_context(query_text: str, kb_dir: str = "dir", max_snippets: int = 5) -> str: 
     """ Simple keyword RAG (no embeddings): find lines containing query keywords. """ 
     docs = read_files(kb_dir) 
     if not docs: 
         return "" # naive keywords: long-ish tokens 
-    tokens = [t.strip("(){}[];,.") for t in query_text.split()] 
-    tokens = [t for t in tokens if len(t) >= 6] # reduce noise 
-    hits = [] 
+    tokens = [t.strip("(){}[];,.").lower() for t in query_text.split()] 
+    # reduce noise; a repeated word would only cost another scan
+    tokens = list(dict.fromkeys(t for t in tokens if len(t) >= 6))
+    if not tokens:
+        return ""
+
+    automaton = None
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for tok in tokens:
+            automaton.add_word(tok, tok)
+        automaton.make_automaton()
+    # without the automaton, one alternation (longest first) still scans each
+    # line once in C instead of once per token
+    pattern = re.compile("|".join(map(re.escape, sorted(tokens, key=len, reverse=True))))
+
+    seen = set()
+    uniq: List[Tuple[str, str]] = []
     for name, text in docs: 
-        lines = text.splitlines()
-        for ln in lines: 
-            for tok in tokens: 
-                if tok in ln: 
-                    hits.append((name, ln.strip())) 
-                    break # de-dupe 
-                seen = set() 
-                uniq = [] 
-                for name, ln in hits: 
-                    key = (name, ln) 
-                    if key not in seen: 
-                        seen.add(key) 
-                        uniq.append((name, ln)) 
-                uniq = uniq[:max_snippets] 
-                if not uniq: 
-                    return "" 
-                out = ["Knowledge base snippets:"] 
-                for name, ln in uniq: 
-                    out.append(f"- ({name}) {ln}") 
-                    return "\n".join(out)
\ No newline at end of file
+        lowered = text.lower()
+        # offsets into the lowered copy only map back if lowering kept the length
+        if len(lowered) == len(text):
+            # matches come in text order; map each to its line, once per line
+            if automaton is not None:
+                hits = (end for end, _tok in automaton.iter(lowered))
+            else:
+                hits = (m.start() for m in pattern.finditer(lowered))
+            last_start = -1
+            for pos in hits:
+                start, ln = _line_at(text, pos)
+                if start == last_start:
+                    continue
+                last_start = start
+                key = (name, ln.strip())
+                if key not in seen:
+                    seen.add(key)
+                    uniq.append(key)
+                    if len(uniq) >= max_snippets:
+                        break
+        else:
+            for ln, ln_lower in zip(text.splitlines(), lowered.splitlines()):
+                if pattern.search(ln_lower):
+                    key = (name, ln.strip())
+                    if key not in seen:
+                        seen.add(key)
+                        uniq.append(key)
+                        if len(uniq) >= max_snippets:
+                            break
+        if len(uniq) >= max_snippets:
+            break
+
+    if not uniq: 
+        return "" 
+    out = ["Knowledge base snippets:"] 
+    for name, ln in uniq: 
+        out.append(f"- ({name}) {ln}") 
+    return "\n".join(out)
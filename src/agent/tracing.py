@@ -1,33 +1,57 @@
-import json
+import logging
 import os
 import time
 import uuid
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from agent.agents._json_utils import dumpb
 
 RUNS_DIR = "runs"
+# Trace files are read by tools, so they are written compact; TRACE_PRETTY=1
+# indents them for reading by hand.
+PRETTY = os.environ.get("TRACE_PRETTY", "0") == "1"
+# TRACE_STDOUT=1 also echoes every written trace to stdout (debugging only)
+ECHO_STDOUT = os.environ.get("TRACE_STDOUT", "0") == "1"
+
+_log = logging.getLogger(__name__)
 
 class Trace:
     def __init__(self, enabled: bool):
         self.enabled = enabled
-        self.run_id = str(uuid.uuid4())
+        self._run_id: Optional[str] = None
         self.started_at = time.time()
-        self.steps: List[Dict[str, Any]] = []
+        self.started_ns = time.monotonic_ns()
+        # (name, ns since started_ns, data) as logged; shaped into dicts (with
+        # epoch timestamps) only by to_dict()/write()
+        self.steps: List[Tuple[str, int, Dict[str, Any]]] = []
         self.final_output: Optional[str] = None
 
-    def log_step(self, name: str, data: Dict[str, Any]):
-        self.steps.append({
-            "name": name,
-            "ts": time.time(),
-            "data": data
-        })
+    @property
+    def run_id(self) -> str:
+        """Generated on first use; most traces are never written."""
+        if self._run_id is None:
+            self._run_id = str(uuid.uuid4())
+        return self._run_id
+
+    def log_step(self, name: str, data: Union[Dict[str, Any], Callable[[], Dict[str, Any]]]):
+        """`data` may be a zero-arg callable; it is only called when tracing is enabled."""
+        if not self.enabled:
+            return
+        if callable(data):
+            data = data()
+        self.steps.append((name, time.monotonic_ns() - self.started_ns, data))
     
     def to_dict(self):
         """Return JSON-serializable trace"""
+        started_at = self.started_at
         return {
             "run_id": self.run_id,
-            "started_at": self.started_at,
-            "ended_at": time.time(),
-            "steps": self.steps,
+            "started_at": started_at,
+            "ended_at": started_at + (time.monotonic_ns() - self.started_ns) / 1e9,
+            "steps": [
+                {"name": name, "ts": started_at + ns / 1e9, "data": data}
+                for name, ns, data in self.steps
+            ],
             "final_output": self.final_output,
         }
 
@@ -38,15 +62,12 @@ class Trace:
         if not self.enabled:
             return
         os.makedirs(RUNS_DIR, exist_ok=True)
-        payload = {
-            "run_id": self.run_id,
-            "started_at": self.started_at,
-            "ended_at": time.time(),
-            "steps": self.steps,
-            "final_output": self.final_output,
-        }
+        payload = self.to_dict()
         path = os.path.join(RUNS_DIR, f"run_{self.run_id}.json")
-        print(path)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(payload, f, ensure_ascii=False, indent=2)
-            print(payload)
+        # the whole trace is serialized once, here, and written in one call
+        data = dumpb(payload, indent=PRETTY)
+        with open(path, "wb", buffering=1 << 16) as f:
+            f.write(data)
+        _log.debug("trace written: %s", path)
+        if ECHO_STDOUT:
+            print(data.decode("utf-8"), flush=True)
@@ -1,4 +1,6 @@
 import argparse
+import logging
+from pathlib import Path
 from agent.runner import run
 
 def main():
@@ -8,18 +10,17 @@ def main():
                         help="Run mode")
     parser.add_argument("--model", default="llama3.1", help="Ollama model name")
     parser.add_argument("--trace", action="store_true", help="Write trace log to runs/")
+    parser.add_argument("--verbose", action="store_true", help="Enable debug logging")
     parser.add_argument("files", nargs="+", help="One MVEL file (or two for diff)")
     args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
 
     if args.mode == "diff" and len(args.files) != 2:
         raise SystemExit("diff mode requires two files: old.mvel new.mvel")
     if args.mode != "diff" and len(args.files) != 1:
         raise SystemExit(f"{args.mode} mode requires exactly one file")
 
-    texts = []
-    for p in args.files:
-        with open(p, "r", encoding="utf-8", errors="replace") as f:
-            texts.append(f.read())
+    texts = [Path(p).read_text(encoding="utf-8", errors="replace") for p in args.files]
 
     result = run(mode=args.mode, mvel_texts=texts, model=args.model, enable_trace=args.trace)
     print(result)
@@ -1,19 +1,28 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+from flask import Flask, Response, render_template, request, redirect, stream_with_context, url_for
 import os
 from agent.runner import run
-from agent.llm import get_llm
-# Use message helper compatible with installed langchain_core
-from langchain_core.messages.human import HumanMessage
 import logging
 import hashlib
-import time
 import re
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from threading import Lock
 import redis
+from cachetools import TTLCache
+from agent.agents._json_utils import dumpb, dumps, loads
+
+try:
+    from datasketch import MinHash, MinHashLSH
+except ImportError:
+    MinHash = MinHashLSH = None
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024  # 2MB upload limit
 
+
+def ojsonify(obj, status: int = 200):
+    # jsonify() goes through stdlib json; rule lists and traces encode much faster with orjson
+    return app.response_class(dumpb(obj), status=status, mimetype="application/json")
+
 #redis config
 REDIS_HOST = os.environ.get("REDIS_HOST", "127.0.0.1")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", "6379"))
@@ -22,13 +31,195 @@ REDIS_DB   = int(os.environ.get("REDIS_DB", "0"))
 rdb = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
 
 RULE_FIELDS = ["rule_id", "application", "sub_module", "rule_type", "rule_name", "rule_def", "rule_desc"]
-# Simple in-memory cache: key -> (description, timestamp)
-_desc_cache = {}
-_cache_lock = Lock()
 # TTL for cache entries (seconds)
 CACHE_TTL = 24 * 3600
+# Descriptions are cached in Redis (desc:<key>) so every worker shares hits and
+# they survive restarts. _desc_cache is a small per-process L1 in front of it:
+# bounded LRU with per-entry TTL; TTLCache isn't thread-safe, so access stays
+# under the lock.
+DESC_PREFIX = "desc:"
+_desc_cache = TTLCache(maxsize=1024, ttl=CACHE_TTL)
+_cache_lock = Lock()
+# Agent runs happen on a bounded pool instead of the request thread; _inflight
+# maps a description key to the run already producing it (guarded by
+# _cache_lock), so a burst of identical misses makes one set of LLM calls.
+DESC_WORKERS = int(os.environ.get("DESC_WORKERS", "4"))
+DESC_TIMEOUT = float(os.environ.get("DESC_TIMEOUT", "300"))
+_llm_executor = ThreadPoolExecutor(max_workers=DESC_WORKERS, thread_name_prefix="desc")
+_inflight: dict[str, Future] = {}
+
+# Near-duplicate lookup: MinHash LSH over 5-token shingles of the definition, so
+# a one-character edit can reuse a cached description. Candidates are confirmed
+# with an exact Jaccard check. Off by default (DESC_NEAR_DUP=1 to enable): a
+# near-identical rule can still differ in a value the description must state.
+NEAR_DUP_ENABLED = os.environ.get("DESC_NEAR_DUP", "0") == "1" and MinHash is not None
+NEAR_DUP_THRESHOLD = float(os.environ.get("DESC_NEAR_DUP_THRESHOLD", "0.9"))
+NEAR_DUP_PERM = 128
+DESC_DEF_PREFIX = "descdef:"  # key -> definition, for the Jaccard check
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_lsh_indexes = {}
+_lsh_lock = Lock()
+
+
+def _shingles(definition: str) -> set:
+    tokens = _TOKEN_RE.findall(definition)
+    if len(tokens) < 5:
+        return {tuple(tokens)}
+    return {tuple(tokens[i:i + 5]) for i in range(len(tokens) - 4)}
+
+
+def _minhash(shingles: set):
+    mh = MinHash(num_perm=NEAR_DUP_PERM)
+    for sh in shingles:
+        mh.update(" ".join(sh).encode("utf-8"))
+    return mh
+
+
+def _lsh_for(model: str, mode: str):
+    # one index per (model, mode): descriptions are only interchangeable within one
+    with _lsh_lock:
+        lsh = _lsh_indexes.get((model, mode))
+        if lsh is None:
+            lsh = MinHashLSH(
+                threshold=NEAR_DUP_THRESHOLD,
+                num_perm=NEAR_DUP_PERM,
+                storage_config={
+                    "type": "redis",
+                    "basename": f"desc_lsh:{model}:{mode}".encode("utf-8"),
+                    "redis": {"host": REDIS_HOST, "port": REDIS_PORT, "db": REDIS_DB},
+                },
+            )
+            _lsh_indexes[(model, mode)] = lsh
+        return lsh
+
+
+def _near_duplicate_key(definition: str, model: str, mode: str):
+    """Cache key of a previously described definition within the Jaccard threshold, or None."""
+    shingles = _shingles(definition)
+    lsh = _lsh_for(model, mode)
+    for cand in lsh.query(_minhash(shingles)):
+        key = cand.decode("utf-8") if isinstance(cand, bytes) else cand
+        other = rdb.get(DESC_DEF_PREFIX + key)
+        if other is None:
+            # The LSH entries have no TTL; drop ones whose definition has
+            # expired so the index doesn't keep returning dead keys.
+            try:
+                lsh.remove(key)
+            except ValueError:
+                pass  # another worker removed it first
+            continue
+        other_sh = _shingles(other)
+        if len(shingles & other_sh) / max(1, len(shingles | other_sh)) >= NEAR_DUP_THRESHOLD:
+            return key
+    return None
+
+
+def _remember_near_duplicate(key: str, definition: str, model: str, mode: str) -> None:
+    lsh = _lsh_for(model, mode)
+    # (re)set the definition first: an indexed key whose entry expired is only
+    # pruned on lookup, and must stay usable once its description is cached again
+    rdb.setex(DESC_DEF_PREFIX + key, CACHE_TTL, definition)
+    if key in lsh:
+        return
+    try:
+        lsh.insert(key, _minhash(_shingles(definition)))
+    except ValueError:
+        pass  # another worker indexed it first
+
+
+# Patterns used by _clean_text on every generated description, compiled once.
+_LEADIN_RE = re.compile(r"^\s*(Here is(?: a)?(?: .*?)?:|Here\'s:?|Here you go:?|Here you are:?|Assistant:|Response:)\s*\n*", re.I)
+_LABEL_RE = re.compile(r"^.*?:\s*\n+")
+_CTRL_RE = re.compile(r"[\x00-\x1f\x7f]+")
+_WS_RE = re.compile(r"\s+")
+# drop straight/curly quotes and guillemets, turn line breaks into spaces: one pass
+_QUOTE_STRIP = str.maketrans({**dict.fromkeys('"\'“”‘’«»'), "\r": " ", "\n": " "})
+_SENT_SPLIT_RE = re.compile(r'(?<=[\.!?;:])\s+')
+_WORD_RE = re.compile(r"\w+")
+_RESTATE_START_RE = re.compile(r"^\s*(the rule|this rule|it checks|it validates|it ensures|it verifies|ensures|verifies|validates|checks)\b", re.I)
+_RESTATE_MARKER_RE = re.compile(r"\balternatively\b|\balso\b|\bin summary\b|\bfor example\b", re.I)
+
+
+def _clean_text(text: str, definition: str) -> str:
+    """Strip lead-ins, restated sentences and quotes from a generated description."""
+    if not text:
+        return ''
+    t = text.strip()
+    t = _LEADIN_RE.sub('', t)
+    t = _LABEL_RE.sub('', t, count=1)
+    t = _CTRL_RE.sub(' ', t)
+    t = _WS_RE.sub(' ', t).strip()
+
+    sentences = _SENT_SPLIT_RE.split(t)
+    # the definition is the same for every sentence, so split it into words once
+    def_words = frozenset(_WORD_RE.findall(definition.lower()))
+
+    def is_restatement(s: str) -> bool:
+        if len(s.strip()) < 10:
+            return True
+        if _RESTATE_START_RE.match(s.strip()):
+            return True
+        if _RESTATE_MARKER_RE.search(s):
+            return True
+
+        s_lower = s.lower()
+        sent_words = frozenset(_WORD_RE.findall(s_lower))
+        if not def_words or not sent_words:
+            return False
+
+        inter = len(def_words & sent_words)
+        if inter / len(def_words) > 0.45 or inter / len(sent_words) > 0.45:
+            return True
+
+        if 'validation' in s_lower and 'account' in s_lower:
+            return True
+        return False
+
+    kept = []
+    for s in sentences:
+        if not s or is_restatement(s):
+            continue
+        kept.append(s.strip())
+
+    out = ' '.join(kept).strip()
+    if not out:
+        out = t
+
+    out = out.translate(_QUOTE_STRIP)
+    out = _WS_RE.sub(' ', out).strip()
+    return out
+
+
+def _cached_description(key: str):
+    """Cached payload for a description key: per-process L1, then Redis."""
+    with _cache_lock:
+        payload = _desc_cache.get(key)
+    if payload is None:
+        try:
+            raw = rdb.get(DESC_PREFIX + key)
+        except redis.RedisError:
+            logging.exception("Failed to read description cache")
+            raw = None
+        if raw is not None:
+            payload = loads(raw)
+            with _cache_lock:
+                _desc_cache[key] = payload
+    return payload
 
 def list_rule_id():
+    # rule:all is the set of rule ids kept by the rule writers; let Redis sort it
+    # numerically instead of scanning the keyspace.
+    if rdb.exists("rule:all"):
+        try:
+            return rdb.sort("rule:all")
+        except redis.ResponseError:
+            # a non-numeric member: filter and sort client-side
+            ids = [rid for rid in rdb.smembers("rule:all") if rid.isdigit()]
+            return sorted(ids, key=int)
+    return _scan_rule_ids()
+
+def _scan_rule_ids():
+    # fallback for stores without a rule:all set
     found = []
     for key in rdb.scan_iter(match="rule:*", count=500):
         if key in ("rule:id", "rule:all"):
@@ -39,8 +230,7 @@ def list_rule_id():
                 found.append(rid)
     return sorted(set(found), key=lambda x: int(x))
 
-def _get_rule(rule_id: str) -> dict:
-    d = rdb.hgetall(f"rule:{rule_id}") or {}
+def _normalize_rule(rule_id: str, d: dict) -> dict:
     # normalize: ensure all expected fields exist
     for f in RULE_FIELDS:
         d.setdefault(f, "")
@@ -50,9 +240,25 @@ def _get_rule(rule_id: str) -> dict:
     return d
 
 
-def _get_all_rules() -> list[dict]:
-    ids = list_rule_id()
-    return [_get_rule(rid) for rid in ids]
+def _get_rule(rule_id: str) -> dict | None:
+    # HGETALL of a missing key is empty, so it doubles as the existence check
+    d = rdb.hgetall(f"rule:{rule_id}")
+    if not d:
+        return None
+    return _normalize_rule(rule_id, d)
+
+
+RULES_BATCH = 100
+
+
+def _iter_rule_batches(ids: list[str]):
+    """Normalized rules for ids, one list per RULES_BATCH-sized pipeline round trip."""
+    for i in range(0, len(ids), RULES_BATCH):
+        chunk = ids[i:i + RULES_BATCH]
+        pipe = rdb.pipeline(transaction=False)
+        for rid in chunk:
+            pipe.hgetall(f"rule:{rid}")
+        yield [_normalize_rule(rid, d or {}) for rid, d in zip(chunk, pipe.execute())]
 
 @app.route('/', methods=['GET'])
 def index():
@@ -60,19 +266,66 @@ def index():
 
 @app.route("/api/rules", methods=["GET"])
 def api_rules():
-    rules = _get_all_rules()
-    return jsonify({"count": len(rules), "rules": rules})
+    ids = list_rule_id()
+
+    # Stream the array a batch at a time: the first rules go out while later
+    # batches are still being fetched, and the full list is never held twice.
+    def gen():
+        yield b'{"count":' + dumpb(len(ids)) + b',"rules":['
+        sep = b""
+        for batch in _iter_rule_batches(ids):
+            yield sep + b",".join(map(dumpb, batch))
+            sep = b","
+        yield b"]}"
+
+    return Response(stream_with_context(gen()), mimetype="application/json")
 
 
 @app.route("/api/rules/<rule_id>", methods=["GET"])
 def api_rule(rule_id):
     rule = _get_rule(rule_id)
-    if not rule or (not rdb.exists(f"rule:{rule_id}")):
-        return jsonify({"error": "not found"}), 404
-    return jsonify(rule)
+    if rule is None:
+        return ojsonify({"error": "not found"}, 404)
+    return ojsonify(rule)
 
 
 
+def _describe(key: str, definition: str, model: str, mode: str, force: bool) -> dict:
+    """Run the agent for one description and cache the result (unless forced)."""
+    try:
+        # ✅ Always define result/text/trace
+        try:
+            result = run(mode=mode, mvel_texts=[definition], model=model, enable_trace=True)
+            if isinstance(result, str):
+                result = {"output": result, "trace": None}
+        except Exception as e:
+            logging.exception("Error running agent")
+            result = {"output": f"Error running agent: {e}", "trace": None}
+
+        text = (result.get("output") or "").strip()
+        trace = result.get("trace")
+
+        cleaned = _clean_text(text, definition)
+
+        payload = {"description": cleaned, "trace": trace}
+
+        if not force:
+            try:
+                with _cache_lock:
+                    _desc_cache[key] = payload
+                rdb.setex(DESC_PREFIX + key, CACHE_TTL, dumps(payload))
+                if NEAR_DUP_ENABLED:
+                    _remember_near_duplicate(key, definition, model, mode)
+            except Exception:
+                logging.exception('Failed to write cache')
+        return payload
+    finally:
+        if not force:
+            # the L1 entry is already set, so requests arriving after this hit the cache
+            with _cache_lock:
+                _inflight.pop(key, None)
+
+
 @app.route('/api/generate-description', methods=['POST'])
 def generate_description():
     data = request.get_json(force=True) or {}
@@ -83,104 +336,46 @@ def generate_description():
   #  force = bool(data.get('force', False))
     
     if not definition:
-        return jsonify({'description': ''}), 200
+        return ojsonify({'description': ''}, 200)
 
-    result = run(mode=mode, mvel_texts=[definition], model=model, enable_trace=trace)
     mode = data.get('mode', "verify")
     force = bool(data.get('force', False))
 
-    def _clean_text(text: str) -> str:
-        if not text:
-            return ''
-        t = text.strip()
-        t = re.sub(r"^\s*(Here is(?: a)?(?: .*?)?:|Here\'s:?|Here you go:?|Here you are:?|Assistant:|Response:)\s*\n*", '', t, flags=re.I)
-        t = re.sub(r"^.*?:\s*\n+", '', t, count=1)
-        t = re.sub(r"[\x00-\x1f\x7f]+", ' ', t)
-        t = re.sub(r"\s+", ' ', t).strip()
-
-        sentences = re.split(r'(?<=[\.!?;:])\s+', t)
-
-        def word_set(s: str):
-            return set([w for w in re.findall(r"\w+", s.lower())])
-
-        def is_restatement(s: str) -> bool:
-            if len(s.strip()) < 10:
-                return True
-            if re.match(r"^\s*(the rule|this rule|it checks|it validates|it ensures|it verifies|ensures|verifies|validates|checks)\b", s.strip(), flags=re.I):
-                return True
-            if re.search(r"\balternatively\b|\balso\b|\bin summary\b|\bfor example\b", s, flags=re.I):
-                return True
-
-            def_words = word_set(definition)
-            sent_words = word_set(s)
-            if not def_words or not sent_words:
-                return False
-
-            overlap = len(def_words & sent_words) / max(1, len(def_words))
-            overlap_sent = len(def_words & sent_words) / max(1, len(sent_words))
-            if overlap > 0.45 or overlap_sent > 0.45:
-                return True
-
-            if 'validation' in s.lower() and 'account' in s.lower():
-                return True
-            return False
-
-        kept = []
-        for s in sentences:
-            if not s or is_restatement(s):
-                continue
-            kept.append(s.strip())
-
-        out = ' '.join(kept).strip()
-        if not out:
-            out = t
-
-        out = out.strip()
-        out = out.replace('"', '').replace("'", '')
-        out = out.replace('“', '').replace('”', '').replace('‘', '').replace('’', '')
-        out = out.replace('«', '').replace('»', '')
-        out = re.sub(r"[\r\n]+", ' ', out)
-        out = re.sub(r"\s+", ' ', out).strip()
-        return out
-
     # ✅ cache key MUST include mode (and preferably force doesn't cache anyway)
     key = hashlib.sha256((definition + '||' + model + '||' + mode).encode('utf-8')).hexdigest()
 
     # ✅ Cache read (return BOTH description + trace so UI updates even on cache hits)
     if not force:
-        with _cache_lock:
-            entry = _desc_cache.get(key)
-            if entry:
-                payload, ts = entry
-                if time.time() - ts < CACHE_TTL:
-                    return jsonify(payload), 200
-                else:
-                    del _desc_cache[key]
-
-    # ✅ Always define result/text/trace
-    try:
-        result = run(mode=mode, mvel_texts=[definition], model=model, enable_trace=True)
-        if isinstance(result, str):
-            result = {"output": result, "trace": None}
-    except Exception as e:
-        logging.exception("Error running agent")
-        result = {"output": f"Error running agent: {e}", "trace": None}
-
-    text = (result.get("output") or "").strip()
-    trace = result.get("trace")
-
-    cleaned = _clean_text(text)
-
-    payload = {"description": cleaned, "trace": trace}
-
-    if not force:
+        payload = _cached_description(key)
+        if payload is None and NEAR_DUP_ENABLED:
+            try:
+                near_key = _near_duplicate_key(definition, model, mode)
+            except Exception:
+                logging.exception("Near-duplicate lookup failed")
+                near_key = None
+            if near_key is not None:
+                payload = _cached_description(near_key)
+        if payload is not None:
+            return ojsonify(payload, 200)
+
+    # Concurrent misses for the same key share one agent run; force always runs.
+    payload = fut = None
+    with _cache_lock:
+        if not force:
+            # a run may have finished between the cache read above and here
+            payload = _desc_cache.get(key)
+            fut = _inflight.get(key)
+        if payload is None and fut is None:
+            fut = _llm_executor.submit(_describe, key, definition, model, mode, force)
+            if not force:
+                _inflight[key] = fut
+    if payload is None:
         try:
-            with _cache_lock:
-                _desc_cache[key] = (payload, time.time())
-        except Exception:
-            logging.exception('Failed to write cache')
+            payload = fut.result(timeout=DESC_TIMEOUT)
+        except FutureTimeout:
+            return ojsonify({"error": "description generation timed out"}, 504)
 
-    return jsonify(payload), 200
+    return ojsonify(payload, 200)
 
 
 @app.route("/api/rules/<rule_id>/description", methods=["POST"])
@@ -188,15 +383,15 @@ def api_save_description(rule_id):
     data = request.get_json(force=True) or {}
     desc = (data.get("description") or "").strip()
     if not desc:
-        return jsonify({"error": "description required"}), 400
+        return ojsonify({"error": "description required"}, 400)
 
     key = f"rule:{rule_id}"
     if not rdb.exists(key):
-        return jsonify({"error": "rule not found"}), 404
+        return ojsonify({"error": "rule not found"}, 404)
 
             # store as a new field (rule_desc)
     rdb.hset(key, "rule_desc", desc)
-    return jsonify({"ok": True, "rule_id": rule_id, "rule_desc": desc})
+    return ojsonify({"ok": True, "rule_id": rule_id, "rule_desc": desc})
                 
 
 if __name__ == '__main__':